@@ -0,0 +1,173 @@
+import math
+import multiprocessing
+import os
+
+import numpy as np
+
+from analysis import FEATURE_INDEX, FEATURES
+from instrument import stage
+
+K = 3
+SHARD_ROWS = 250_000
+
+# clusterStats keys -> feature columns.
+STAT_COLUMNS = {
+    "active": FEATURE_INDEX["ActiveCompoundPct"],
+    "heavy": FEATURE_INDEX["HeavyMetalPpm"],
+    "waterExtract": FEATURE_INDEX["WaterExtractPct"],
+    "alcoholExtract": FEATURE_INDEX["AlcoholExtractPct"],
+}
+
+
+def encode_brands(brands):
+    """Integer codes and names of a Brand column, in order of first appearance."""
+    index = {}
+    codes = np.fromiter((index.setdefault(brand, len(index)) for brand in brands), dtype=np.int64, count=len(brands))
+    return codes, list(index)
+
+
+def _partial(args):
+    """Per-brand cluster counts and feature sums, per-cluster counts and sums of one shard."""
+    codes, X, clusters, nb = args
+    clusters = np.asarray(clusters, dtype=np.int64)
+    brand_counts = np.bincount(codes * (K + 1) + clusters, minlength=nb * (K + 1)).reshape(nb, K + 1)
+    brand_sums = np.empty((nb, len(FEATURES)))
+    cluster_sums = np.empty((K + 1, len(FEATURES)))
+    for j in range(len(FEATURES)):
+        brand_sums[:, j] = np.bincount(codes, weights=X[:, j], minlength=nb)
+        cluster_sums[:, j] = np.bincount(clusters, weights=X[:, j], minlength=K + 1)
+    return brand_counts, brand_sums, np.bincount(clusters, minlength=K + 1), cluster_sums
+
+
+class Aggregates:
+    """Per-cluster and per-brand counts and feature sums behind the dashboard's
+    summary views: clusterStats, clusterCounts, flaggedSamples/cleanSamples
+    and computeBrandConsistency.
+
+    Cluster 0 holds samples that have not been analyzed yet. Every change
+    (insert, delete, edit, reassign) touches one cluster row and one brand
+    row, so it costs the same whatever the dataset size. Brands keep the
+    order of their first insert, as computeBrandConsistency lists them.
+    """
+
+    def __init__(self):
+        self.brands = {}
+        self.brand_counts = np.zeros((0, K + 1), dtype=np.int64)
+        self.brand_sums = np.zeros((0, len(FEATURES)))
+        self.cluster_counts = np.zeros(K + 1, dtype=np.int64)
+        self.cluster_sums = np.zeros((K + 1, len(FEATURES)))
+
+    def __len__(self):
+        return int(self.cluster_counts.sum())
+
+    @classmethod
+    def build(cls, brands, X, clusters, jobs=1, shard_rows=SHARD_ROWS, names=None):
+        """Aggregate a whole dataset, reducing shards in a process pool when jobs > 1.
+
+        ``brands`` is either a sequence of Brand strings or, with ``names``,
+        integer codes into ``names`` (e.g. a SampleStore's Brand codes and
+        dictionary values). Shards only carry numeric arrays to the workers.
+        """
+        with stage("aggregates"):
+            if names is None:
+                codes, names = encode_brands(brands)
+            else:
+                codes = np.asarray(brands, dtype=np.int64)
+            X = np.asarray(X, dtype=np.float64)
+            shards = [(codes[i:i + shard_rows], X[i:i + shard_rows], clusters[i:i + shard_rows], len(names))
+                      for i in range(0, len(X), shard_rows)]
+            if jobs == 1 or len(shards) <= 1:
+                partials = [_partial(shard) for shard in shards]
+            else:
+                with multiprocessing.Pool(min(jobs or os.cpu_count(), len(shards))) as pool:
+                    partials = list(pool.imap_unordered(_partial, shards))
+
+            brand_counts = sum((p[0] for p in partials), np.zeros((len(names), K + 1), dtype=np.int64))
+            brand_sums = sum((p[1] for p in partials), np.zeros((len(names), len(FEATURES))))
+            agg = cls()
+            agg.cluster_counts += sum((p[2] for p in partials), 0)
+            agg.cluster_sums += sum((p[3] for p in partials), 0)
+            # Unused dictionary entries (e.g. '' in a SampleStore) are not brands.
+            present = brand_counts.sum(axis=1) > 0
+            agg.brands = {name: code for code, name in enumerate(name for name, used in zip(names, present) if used)}
+            agg.brand_counts = brand_counts[present]
+            agg.brand_sums = brand_sums[present]
+            return agg
+
+    def _brand(self, name):
+        code = self.brands.get(name)
+        if code is None:
+            code = self.brands[name] = len(self.brands)
+            if code == len(self.brand_counts):
+                grow = max(8, len(self.brand_counts))
+                self.brand_counts = np.vstack([self.brand_counts, np.zeros((grow, K + 1), dtype=np.int64)])
+                self.brand_sums = np.vstack([self.brand_sums, np.zeros((grow, len(FEATURES)))])
+        return code
+
+    # O(1) updates
+
+    def insert(self, brand, x, cluster=0):
+        code = self._brand(brand)
+        self.brand_counts[code, cluster] += 1
+        self.brand_sums[code] += x
+        self.cluster_counts[cluster] += 1
+        self.cluster_sums[cluster] += x
+
+    def delete(self, brand, x, cluster=0):
+        code = self.brands[brand]
+        self.brand_counts[code, cluster] -= 1
+        self.brand_sums[code] -= x
+        self.cluster_counts[cluster] -= 1
+        self.cluster_sums[cluster] -= x
+
+    def edit(self, old_brand, old_x, new_brand, new_x, cluster=0):
+        self.delete(old_brand, old_x, cluster)
+        self.insert(new_brand, new_x, cluster)
+
+    def reassign(self, brand, x, old_cluster, new_cluster):
+        code = self.brands[brand]
+        self.brand_counts[code, old_cluster] -= 1
+        self.brand_counts[code, new_cluster] += 1
+        self.cluster_counts[old_cluster] -= 1
+        self.cluster_counts[new_cluster] += 1
+        self.cluster_sums[old_cluster] -= x
+        self.cluster_sums[new_cluster] += x
+
+    def relabel(self, mapping):
+        """Apply a ClusterId permutation ({old: new}) after a rerun reorders clusters."""
+        order = np.arange(K + 1)
+        for old, new in mapping.items():
+            order[new] = old
+        self.brand_counts[:] = self.brand_counts[:, order]
+        self.cluster_counts[:] = self.cluster_counts[order]
+        self.cluster_sums[:] = self.cluster_sums[order]
+
+    # Views
+
+    def cluster_count_map(self):
+        return {cluster_id: int(self.cluster_counts[cluster_id]) for cluster_id in range(1, K + 1)}
+
+    def cluster_stats(self):
+        """clusterStats: per-cluster averages, 0 for empty clusters."""
+        stats = {}
+        for cluster_id in range(1, K + 1):
+            count = self.cluster_counts[cluster_id]
+            sums = self.cluster_sums[cluster_id]
+            stats[cluster_id] = {key: float(sums[col] / count) if count else 0.0 for key, col in STAT_COLUMNS.items()}
+        return stats
+
+    def flagged_samples(self):
+        return int(self.cluster_counts[2:].sum())
+
+    def clean_samples(self):
+        return int(self.cluster_counts[1])
+
+    def brand_consistency(self):
+        """computeBrandConsistency: share of each brand's analyzed samples in cluster 1, Math.round-ed.
+
+        Unanalyzed samples (cluster 0) are left out, and brands with none analyzed are skipped.
+        """
+        with stage("brand_scoring"):
+            totals = self.brand_counts[:, 1:].sum(axis=1)
+            return [{"name": name, "score": math.floor(self.brand_counts[code, 1] / totals[code] * 100 + 0.5)}
+                    for name, code in self.brands.items() if totals[code]]
@@ -0,0 +1,225 @@
+import logging
+from dataclasses import dataclass
+
+import numpy as np
+
+from instrument import observe, stage
+
+logger = logging.getLogger(__name__)
+
+# Same order as `features` in handleRunAnalysis (Dashboard.tsx).
+FEATURES = (
+    "MoisturePct", "TotalAsh", "AcidInsolAsh", "HeavyMetalPpm",
+    "ActiveCompoundPct", "WaterExtractPct", "AlcoholExtractPct",
+    "BulkDensity", "TapDensity", "pH",
+)
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURES)}
+ACTIVE = FEATURE_INDEX["ActiveCompoundPct"]
+
+CLUSTER_LABELS = {1: "High Purity", 2: "Moderate Risk", 3: "Contaminated"}
+
+INDUSTRY_BENCHMARKS = {
+    "label": "WHO / FSSAI / IP Guidelines",
+    "HeavyMetalPpm": 10,
+    "MoisturePct": 8,
+    "TotalAsh": 5,
+    "AcidInsolAsh": 1.0,
+    "ActiveCompoundPct": 85,
+    "WaterExtractPct": 15,
+    "AlcoholExtractPct": 10,
+    "pH": {"min": 5.5, "max": 7.5},
+    "CarrsIndex": 25,
+    "HausnersRatio": 1.35,
+}
+
+MIN_SAMPLES = 6
+NO_DIVERSITY = "Analysis failed: not enough sample diversity. Please add more samples."
+LOW_SEPARATION = "Warning: cluster separation is low, mapping may be unreliable"
+
+
+class AnalysisError(ValueError):
+    pass
+
+
+@dataclass
+class KMeansResult:
+    labels: np.ndarray
+    centroids: np.ndarray
+    iterations: int
+    inertia: float
+    delta: float
+    converged: bool
+
+
+@dataclass
+class AnalysisResult:
+    clusters: np.ndarray       # ClusterId (1, 2 or 3) per sample, int8
+    labels: np.ndarray         # raw k-means index per sample
+    centroids: np.ndarray      # in normalized feature space
+    mins: np.ndarray
+    maxs: np.ndarray
+    index_to_id: dict          # k-means index -> ClusterId, as indexToIdMap
+    avg_active: np.ndarray     # average ActiveCompoundPct per k-means index
+    low_separation: bool
+    kmeans: KMeansResult
+
+
+def feature_matrix(samples, dtype=np.float64):
+    """Contiguous (n, 10) matrix of the clustering features of Sample dicts."""
+    n = len(samples)
+    X = np.empty((n, len(FEATURES)), dtype=dtype)
+    for j, name in enumerate(FEATURES):
+        X[:, j] = [s[name] for s in samples]
+    return X
+
+
+def feature_bounds(X):
+    if len(X) < MIN_SAMPLES:
+        raise AnalysisError(NO_DIVERSITY)
+    mins = X.min(axis=0)
+    maxs = X.max(axis=0)
+    if np.any(mins == maxs):
+        raise AnalysisError(NO_DIVERSITY)
+    return mins, maxs
+
+
+def normalize(X, mins, maxs, out=None):
+    # Min-max scaling; feature_bounds() has already rejected zero ranges.
+    out = np.subtract(X, mins, out=out)
+    out /= maxs - mins
+    return out
+
+
+def squared_distances(X, centroids, x_sq=None):
+    if x_sq is None:
+        x_sq = np.einsum("ij,ij->i", X, X)
+    d2 = X @ (-2.0 * centroids.T)
+    d2 += x_sq[:, None]
+    d2 += np.einsum("ij,ij->i", centroids, centroids)
+    np.maximum(d2, 0.0, out=d2)
+    return d2
+
+
+def kmeans_plus_plus(X, k, rng, x_sq=None):
+    n = len(X)
+    centroids = np.empty((k, X.shape[1]), dtype=X.dtype)
+    centroids[0] = X[rng.integers(n)]
+    closest = squared_distances(X, centroids[:1], x_sq)[:, 0]
+    for c in range(1, k):
+        total = closest.sum()
+        if total > 0:
+            idx = int(np.searchsorted(np.cumsum(closest), rng.random() * total, side="right"))
+            idx = min(idx, n - 1)
+        else:
+            idx = int(rng.integers(n))
+        centroids[c] = X[idx]
+        np.minimum(closest, squared_distances(X, centroids[c:c + 1], x_sq)[:, 0], out=closest)
+    return centroids
+
+
+def kmeans(X, k=3, seed=42, max_iter=100, tol=1e-6, initial=None):
+    """Lloyd's k-means with k-means++ seeding from numpy.random.default_rng(seed).
+
+    The defaults (100 iterations, 1e-6 tolerance on centroid movement)
+    follow ml-kmeans. Seeding is deterministic per seed but uses NumPy's
+    generator, so it does not reproduce ml-kmeans' exact initial centroids.
+    An empty cluster keeps its previous centroid.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    x_sq = np.einsum("ij,ij->i", X, X)
+    with stage("kmeans.seed"):
+        if initial is None:
+            centroids = kmeans_plus_plus(X, k, np.random.default_rng(seed), x_sq)
+        else:
+            centroids = np.array(initial, dtype=np.float64)
+
+    identity = np.eye(k)
+    delta = np.inf
+    iterations = 0
+    converged = False
+    with stage("kmeans.iterate"):
+        for iterations in range(1, max_iter + 1):
+            labels = squared_distances(X, centroids, x_sq).argmin(axis=1)
+            # One-hot matmul: a single BLAS pass for all per-cluster feature sums.
+            onehot = identity[labels]
+            counts = onehot.sum(axis=0)
+            sums = onehot.T @ X
+            updated = centroids.copy()
+            nonempty = counts > 0
+            updated[nonempty] = sums[nonempty] / counts[nonempty, None]
+            delta = float(np.sqrt(((updated - centroids) ** 2).sum(axis=1)).max())
+            centroids = updated
+            if delta <= tol:
+                converged = True
+                break
+
+        d2 = squared_distances(X, centroids, x_sq)
+        labels = d2.argmin(axis=1)
+        inertia = float(d2[np.arange(len(X)), labels].sum())
+    return KMeansResult(labels, centroids, iterations, inertia, delta, converged)
+
+
+def relabel(active, labels, k=3):
+    """Map k-means indices to ClusterId by descending average ActiveCompoundPct.
+
+    Returns (index_to_id, avg_active, low_separation). Empty clusters
+    average 0, and ties keep index order, as with the dashboard's stable
+    sort.
+    """
+    counts = np.bincount(labels, minlength=k)
+    sums = np.bincount(labels, weights=active, minlength=k)
+    return rank_clusters(sums, counts)
+
+
+def rank_clusters(active_sums, counts):
+    """relabel() from per-index ActiveCompoundPct sums and sample counts."""
+    k = len(counts)
+    avg_active = np.divide(active_sums, counts, out=np.zeros(k), where=counts > 0)
+    order = sorted(range(k), key=lambda idx: -avg_active[idx])
+    low_separation = any(abs(avg_active[order[i]] - avg_active[order[i + 1]]) <= 2.0 for i in range(k - 1))
+    if low_separation:
+        logger.warning(LOW_SEPARATION)
+    index_to_id = {idx: rank + 1 for rank, idx in enumerate(order)}
+    return index_to_id, avg_active, low_separation
+
+
+def run_analysis(X, k=3, seed=42, max_iter=100, tol=1e-6):
+    """The handleRunAnalysis pipeline over an (n, 10) feature matrix.
+
+    Raises AnalysisError with the dashboard's message when there are fewer
+    than 6 samples or a feature has no spread.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    observe("samples", len(X))
+    with stage("normalize"):
+        mins, maxs = feature_bounds(X)
+        normalized = normalize(X, mins, maxs)
+    fit = kmeans(normalized, k, seed, max_iter, tol)
+    observe("kmeans_iterations", fit.iterations)
+    observe("kmeans_delta", fit.delta)
+    observe("kmeans_converged", fit.converged)
+    with stage("relabel"):
+        return analysis_result(X, mins, maxs, fit, k)
+
+
+def analysis_result(X, mins, maxs, result, k=3):
+    """Relabel a k-means fit of normalized X into an AnalysisResult."""
+    index_to_id, avg_active, low_separation = relabel(X[:, ACTIVE], result.labels, k)
+    lookup = np.array([index_to_id[i] for i in range(k)], dtype=np.int8)
+    return AnalysisResult(
+        clusters=lookup[result.labels],
+        labels=result.labels,
+        centroids=result.centroids,
+        mins=mins,
+        maxs=maxs,
+        index_to_id=index_to_id,
+        avg_active=avg_active,
+        low_separation=low_separation,
+        kmeans=result,
+    )
+
+
+def analyze_samples(samples, **kwargs):
+    """Sample dicts in, AnalyzedSample dicts (each with a Cluster) out."""
+    result = run_analysis(feature_matrix(samples), **kwargs)
+    return [dict(s, Cluster=int(c)) for s, c in zip(samples, result.clusters)], result
@@ -0,0 +1,260 @@
+import argparse
+import ast
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import refactor
+from codemod_report import StepRegistry
+
+BLOCK_STEPS = ("SampleDetailPanel", "EditSampleForm", "parsePastedData", "AddSampleForm", "ClusterSummaryCard")
+STAGES = ("read", "extract", "replace", "render", "write")
+
+BRANDS = ("Brand A", "Brand B", "Brand C", "Brand D")
+
+
+def _refactor_patterns():
+    # The pre-refactor fragments are the first argument of every rule in
+    # plan_refactor, read from its source so the generator never drifts from
+    # what the codemod actually rewrites.
+    tree = ast.parse(open(refactor.__file__).read())
+    func = next(node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == "plan_refactor")
+    names = {}
+    patterns = []
+    for node in ast.walk(func):
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant) and isinstance(node.targets[0], ast.Name):
+            names[node.targets[0].id] = node.value.value
+    for node in ast.walk(func):
+        if isinstance(node, ast.Call) and getattr(node.func, "attr", "") == "append" and getattr(node.func.value, "id", "") == "rules":
+            old = node.args[0].elts[0]
+            value = old.value if isinstance(old, ast.Constant) else names.get(getattr(old, "id", None))
+            if value is not None:
+                patterns.append(value)
+    return names, patterns
+
+
+def _nested_divs(rng, depth, leaf):
+    if depth == 0:
+        return leaf
+    pad = "    " * depth
+    child = _nested_divs(rng, depth - 1, leaf)
+    return f'<div className="flex flex-col gap-{rng.randint(1, 4)}">\n{pad}{child}\n{pad}<div className="w-2 h-2 rounded-full" />\n{pad}</div>'
+
+
+def _mock_row(rng, i):
+    return (f"    {{ SampleID: 'S-{i:06d}', Brand: '{rng.choice(BRANDS)}', MoisturePct: {rng.uniform(3, 8):.1f}, "
+            f"TotalAsh: {rng.uniform(1.5, 6):.1f}, AcidInsolAsh: {rng.uniform(0.2, 3.5):.1f}, HeavyMetalPpm: {rng.uniform(0.5, 12):.1f}, "
+            f"ActiveCompoundPct: {rng.uniform(65, 97):.1f}, WaterExtractPct: {rng.uniform(8, 23):.1f}, "
+            f"AlcoholExtractPct: {rng.uniform(5, 15):.1f}, BulkDensity: {rng.uniform(0.44, 0.62):.2f}, "
+            f"TapDensity: {rng.uniform(0.5, 0.8):.2f}, pH: {rng.uniform(5.5, 7.2):.1f}, Alkaloids: 'Pass' }},")
+
+
+def _chart_section(rng, legend):
+    scatter = "\n".join(f"                                                {line}" for line in (
+        '<Scatter name="High Purity" data={scatterCluster1} fill={CLUSTER_COLORS[1]} />',
+        '<Scatter name="Moderate Risk" data={scatterCluster2} fill={CLUSTER_COLORS[2]} />',
+        '<Scatter name="Contaminated" data={scatterCluster3} fill={CLUSTER_COLORS[3]} />',
+        legend,
+    ))
+    return _nested_divs(rng, rng.randint(2, 4), f"<ScatterChart>\n{scatter}\n                                            </ScatterChart>")
+
+
+def generate_dashboard(lines, seed=42):
+    """Synthetic pre-refactor Dashboard.tsx of roughly ``lines`` lines.
+
+    Every pattern refactor.py rewrites appears once. The file is scaled with
+    mockData rows and repeated chart sections (nested <div> trees around
+    Scatter/Legend blocks) in a 3:2 ratio of lines.
+    """
+    rng = random.Random(seed)
+    names, patterns = _refactor_patterns()
+    legend = next(p for p in patterns if p.startswith("<Legend"))
+
+    sdp = names["sdp_start"] + "\n" + _nested_divs(rng, 3, "<span>{sample.pH}</span>") + "\n</div>"
+    esf = (names["esf_start"] + "\n"
+           "    {showQualitative && (<div>{editValues?.Color}</div>)}\n"
+           "    {validationError && editingSampleId === sample.SampleID && <p>{validationError}</p>}\n"
+           "    <div className=\"flex justify-end gap-2 mt-2\">\n"
+           "        <button onClick={() => { setEditingSampleId(null); setValidationError(''); }}>Cancel</button>\n"
+           "        <button onClick={() => handleSaveEdit(sample.SampleID)}>Save</button>\n"
+           "    </div>\n</div>")
+    head = [
+        "function SampleRow({ sample }: { sample: Sample }) {",
+        "    return (",
+        "        <>",
+        sdp,
+        esf,
+        "        </>",
+        "    );",
+        "}",
+        "",
+    ]
+    body = [p for p in patterns if not p.startswith("export default")]
+    tail = [
+        "    const parsePastedData = (raw: string) => {",
+        "        return raw.split(/[\\t,]/);",
+        "    };",
+        "    const handleAddSample = () => {",
+        "        setShowAddForm(false);",
+        "    };",
+        names["addform_raw"],
+        "                                <button>",
+        "                                    Add to Dataset",
+        "                                </button>",
+        "                            </div>",
+        "                        )}",
+        '<div className="bg-slate-800 p-5 rounded-xl border border-slate-700 border-t-4 border-t-green-500 shadow-md">',
+        "    card",
+        "</div>\n                                </div>\n                            </div>\n                        </>\n                    )}\n\n                </div>\n\n            </main>",
+        "}",
+    ]
+    fixed = sum(chunk.count("\n") + 1 for chunk in head + body + tail)
+    remaining = max(0, lines - fixed)
+
+    rows = [_mock_row(rng, i) for i in range(remaining * 3 // 5)]
+    charts = []
+    chart_lines = 0
+    while chart_lines < remaining - len(rows):
+        section = _chart_section(rng, legend)
+        charts.append(section)
+        chart_lines += section.count("\n") + 1
+
+    parts = ["const mockData: Sample[] = ["] + rows + ["];", ""] + head
+    parts += ["export default function Dashboard() {"] + body + tail[:6]
+    parts += ["    return (", "        <main>"] + charts + tail[6:]
+    return "\n".join(parts) + "\n"
+
+
+def run_once(path, out_path):
+    timings = {}
+    started = time.perf_counter()
+    with open(path, "r") as f:
+        content = f.read()
+    timings["read"] = time.perf_counter() - started
+
+    registry = StepRegistry()
+    plan = refactor.plan_refactor(content, registry)
+    steps = registry.steps
+    timings["extract"] = steps["tag-index"]["seconds"] + sum(steps[name]["seconds"] for name in BLOCK_STEPS)
+    timings["replace"] = steps["literal-scan"]["seconds"]
+
+    started = time.perf_counter()
+    new_content = plan.render()
+    timings["render"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with open(out_path, "w") as f:
+        f.write(new_content)
+    timings["write"] = time.perf_counter() - started
+    return timings
+
+
+def peak_memory(path):
+    tracemalloc.start()
+    try:
+        with open(path, "r") as f:
+            content = f.read()
+        refactor.plan_refactor(content).render()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_size(lines, repeat, workdir):
+    path = os.path.join(workdir, f"Dashboard-{lines}.tsx")
+    with open(path, "w") as f:
+        f.write(generate_dashboard(lines))
+    size = os.path.getsize(path)
+    out_path = path + ".out"
+
+    best = None
+    for _ in range(repeat):
+        timings = run_once(path, out_path)
+        if best is None:
+            best = timings
+        else:
+            best = {stage: min(best[stage], timings[stage]) for stage in STAGES}
+    total = sum(best.values())
+    result = {
+        "bytes": size,
+        "seconds": best,
+        "total": total,
+        "mb_per_s": size / 1e6 / total if total else 0.0,
+        "peak_bytes": peak_memory(path),
+    }
+    os.remove(path)
+    os.remove(out_path)
+    return result
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for lines, result in results.items():
+        base = baseline.get(lines)
+        if base is None:
+            continue
+        for stage in STAGES + ("total",):
+            now = result["total"] if stage == "total" else result["seconds"][stage]
+            before = base["total"] if stage == "total" else base["seconds"][stage]
+            # Ignore stages too short to time reliably.
+            if before >= 5e-3 and now > before * (1 + tolerance):
+                regressions.append((lines, stage, before, now))
+    return regressions
+
+
+def format_results(results):
+    header = ("lines", "MB") + STAGES + ("total s", "MB/s", "peak MB")
+    rows = []
+    for lines, r in results.items():
+        rows.append((lines, f"{r['bytes'] / 1e6:.2f}") + tuple(f"{r['seconds'][s] * 1000:.1f}ms" for s in STAGES)
+                    + (f"{r['total']:.3f}", f"{r['mb_per_s']:.1f}", f"{r['peak_bytes'] / 1e6:.1f}"))
+    widths = [max(len(str(row[i])) for row in rows + [header]) for i in range(len(header))]
+    return "\n".join("  ".join(str(cell).rjust(width) for cell, width in zip(row, widths)) for row in [header] + rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark refactor.py on synthetic Dashboard.tsx files.")
+    parser.add_argument("--sizes", default="1k,10k,100k,1M", help="comma-separated line counts (default: 1k,10k,100k,1M)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size; the fastest is kept (default: 3)")
+    parser.add_argument("--save", metavar="PATH", help="write results as JSON, e.g. to use as a baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown per stage vs the baseline (default: 0.25)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes.split(","):
+            lines = parse_size(size)
+            results[str(lines)] = bench_size(lines, args.repeat, workdir)
+            print(f"{lines} lines done", file=sys.stderr)
+
+    print(format_results(results))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for lines, stage, before, now in regressions:
+            print(f"REGRESSION {lines} lines, {stage}: {before * 1000:.1f}ms -> {now * 1000:.1f}ms", file=sys.stderr)
+        if regressions:
+            return 1
+        print("No regressions against baseline.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class RefactorCache:
+    """Remembers which files the codemod has already finished.
+
+    Entries are keyed by path and hold the (mtime_ns, size) stat signature
+    and the content hash of the finished file. The whole cache belongs to a
+    single transformation-set version and is discarded when that changes.
+    An unchanged file therefore costs one stat() call. A touched-but-identical
+    file costs one read and hash, but is never parsed.
+    """
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        self.files = {}
+        self.done = set()
+        self.dirty = False
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != version:
+            self.dirty = True
+            return
+        self.files = data.get("files", {})
+        self.done = {entry["sha256"] for entry in self.files.values()}
+
+    def is_fresh(self, path):
+        entry = self.files.get(os.path.abspath(path))
+        if entry is None:
+            return False
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size
+
+    def record(self, path, digest):
+        st = os.stat(path)
+        self.files[os.path.abspath(path)] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": digest}
+        self.done.add(digest)
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": self.version, "files": self.files}, f)
+        os.replace(tmp, self.path)
+        self.dirty = False
@@ -0,0 +1,103 @@
+import json
+import time
+from contextlib import contextmanager
+
+COUNTERS = ("seconds", "bytes_scanned", "matches", "bytes_changed", "bytes_delta", "already_applied")
+
+# Passes shared by all steps; they never match anything themselves.
+SHARED_PASSES = ("tag-index", "literal-scan")
+
+
+class StepRegistry:
+    """Per-transformation counters for the codemod.
+
+    Every named step records wall time, bytes scanned, match count, bytes
+    of the original buffer it rewrote (bytes_changed) and the net size
+    change (bytes_delta). Literal rules are all matched in one shared scan,
+    so their time is reported under a single "literal-scan" step while their
+    matches and bytes are still counted per rule.
+
+    A registry is filled per file by plan_refactor(). The CLI merges those
+    into a run-wide registry, which also counts how many files each step ran
+    on and how many of those it did not match.
+    """
+
+    def __init__(self):
+        self.steps = {}
+
+    def _get(self, name):
+        rec = self.steps.get(name)
+        if rec is None:
+            rec = self.steps[name] = dict.fromkeys(COUNTERS, 0)
+            rec["seconds"] = 0.0
+            rec["files"] = 0
+            rec["zero_match_files"] = 0
+        return rec
+
+    def register(self, name):
+        return self._get(name)
+
+    @contextmanager
+    def step(self, name, bytes_scanned=0):
+        rec = self._get(name)
+        rec["bytes_scanned"] += bytes_scanned
+        start = time.perf_counter()
+        try:
+            yield rec
+        finally:
+            rec["seconds"] += time.perf_counter() - start
+
+    def record(self, name, started, bytes_scanned=0):
+        rec = self._get(name)
+        rec["seconds"] += time.perf_counter() - started
+        rec["bytes_scanned"] += bytes_scanned
+        return rec
+
+    def mark_applied(self, name):
+        self._get(name)["already_applied"] += 1
+
+    def count_edits(self, edits):
+        for start, end, replacement, name in edits:
+            if name is None:
+                continue
+            rec = self._get(name)
+            rec["matches"] += 1
+            rec["bytes_changed"] += end - start
+            rec["bytes_delta"] += len(replacement) - (end - start)
+
+    def zero_match(self):
+        return [name for name, rec in self.steps.items()
+                if name not in SHARED_PASSES and rec["matches"] == 0 and not rec["already_applied"]]
+
+    def to_dict(self):
+        return {name: dict(rec) for name, rec in self.steps.items()}
+
+    def merge(self, steps):
+        for name, other in steps.items():
+            rec = self._get(name)
+            for key in COUNTERS:
+                rec[key] += other[key]
+            rec["files"] += 1
+            if name not in SHARED_PASSES and other["matches"] == 0 and not other["already_applied"]:
+                rec["zero_match_files"] += 1
+
+    def write_json(self, path, **extra):
+        with open(path, "w") as f:
+            json.dump({"steps": self.to_dict(), **extra}, f, indent=2)
+
+    def format_table(self):
+        header = ("step", "time ms", "scanned", "matches", "changed", "delta", "applied", "no match")
+        rows = []
+        for name, rec in sorted(self.steps.items(), key=lambda item: item[1]["seconds"], reverse=True):
+            rows.append((
+                name, f"{rec['seconds'] * 1000:.2f}", str(rec["bytes_scanned"]), str(rec["matches"]),
+                str(rec["bytes_changed"]), f"{rec['bytes_delta']:+d}", str(rec["already_applied"]),
+                str(rec["zero_match_files"]),
+            ))
+        widths = [max(len(row[i]) for row in rows + [header]) for i in range(len(header))]
+        lines = []
+        for row in [header] + rows:
+            cells = [row[0].ljust(widths[0])] + [cell.rjust(width) for cell, width in zip(row[1:], widths[1:])]
+            lines.append("  ".join(cells))
+        lines.insert(1, "  ".join("-" * width for width in widths))
+        return "\n".join(lines)
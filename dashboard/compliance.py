@@ -0,0 +1,153 @@
+import json
+from dataclasses import dataclass
+
+import numpy as np
+
+from analysis import FEATURE_INDEX, INDUSTRY_BENCHMARKS
+
+# Checked columns, in violation-bit order: bit i of a mask is CHECKS[i].
+CHECKS = (
+    "MoisturePct", "TotalAsh", "AcidInsolAsh", "HeavyMetalPpm",
+    "ActiveCompoundPct", "WaterExtractPct", "AlcoholExtractPct",
+    "pH", "CarrsIndex", "HausnersRatio",
+)
+BITS = {name: 1 << i for i, name in enumerate(CHECKS)}
+
+# Limits as SampleDetailPanel applies them: a sample passes at the limit.
+UPPER = ("MoisturePct", "TotalAsh", "AcidInsolAsh", "HeavyMetalPpm", "CarrsIndex", "HausnersRatio")
+LOWER = ("ActiveCompoundPct", "WaterExtractPct", "AlcoholExtractPct")
+
+# Flow bands of the Powder Flow section: 0 good, 1 passable/amber, 2 poor/red.
+CARRS_BANDS = (15, 25)
+HAUSNER_BANDS = (1.2, 1.35)
+
+
+@dataclass(frozen=True)
+class BenchmarkSet:
+    """Per-sample limits for every entry of CHECKS.
+
+    ``lower`` and ``upper`` are aligned with CHECKS, with -inf / inf where a
+    check has no bound on that side.
+    """
+
+    name: str
+    label: str
+    lower: np.ndarray
+    upper: np.ndarray
+
+    @classmethod
+    def from_dict(cls, name, benchmarks):
+        """Build from a dict shaped like INDUSTRY_BENCHMARKS."""
+        lower = np.full(len(CHECKS), -np.inf)
+        upper = np.full(len(CHECKS), np.inf)
+        for i, check in enumerate(CHECKS):
+            limit = benchmarks[check]
+            if check == "pH":
+                lower[i], upper[i] = limit["min"], limit["max"]
+            elif check in UPPER:
+                upper[i] = limit
+            else:
+                lower[i] = limit
+        return cls(name, benchmarks.get("label", name), lower, upper)
+
+
+BENCHMARK_SETS = {}
+
+
+def register_benchmarks(name, benchmarks):
+    BENCHMARK_SETS[name] = BenchmarkSet.from_dict(name, benchmarks)
+    return BENCHMARK_SETS[name]
+
+
+def load_benchmarks(path):
+    """Register every set in a JSON file of {name: INDUSTRY_BENCHMARKS-shaped dict}."""
+    with open(path, "r") as f:
+        return [register_benchmarks(name, benchmarks) for name, benchmarks in json.load(f).items()]
+
+
+register_benchmarks("default", INDUSTRY_BENCHMARKS)
+
+
+def carrs_index(bulk, tap):
+    return (tap - bulk) / tap * 100
+
+
+def hausners_ratio(bulk, tap):
+    return tap / bulk
+
+
+def flow_band(values, bands):
+    # Same edges as the panel: below the first edge is good, the closed
+    # range between them is passable, above the second is poor.
+    low, high = bands
+    return np.where(values < low, 0, np.where(values <= high, 1, 2)).astype(np.int8)
+
+
+def is_compliant(stats, benchmarks=INDUSTRY_BENCHMARKS):
+    """isCompliant() for one cluster's averages (active, heavy, waterExtract, alcoholExtract)."""
+    return (stats["heavy"] < benchmarks["HeavyMetalPpm"]
+            and stats["active"] > benchmarks["ActiveCompoundPct"]
+            and stats["waterExtract"] > benchmarks["WaterExtractPct"]
+            and stats["alcoholExtract"] > benchmarks["AlcoholExtractPct"])
+
+
+class ComplianceTable:
+    """Per-sample compliance for a feature matrix, against any benchmark set.
+
+    The checked values are laid out once as an (n, 10) matrix in CHECKS
+    order. It holds the 8 measured columns and the derived Carr's Index and
+    Hausner ratio, which are computed a single time. check() then compares
+    the whole matrix with a set's bounds in one pass. The result is a uint16
+    violation mask per sample. Masks are cached by the limits themselves, so
+    a set registered again under the same name with new limits is
+    re-checked. Rows with a NaN value never violate that check.
+    """
+
+    def __init__(self, X):
+        X = np.asarray(X)
+        bulk = X[:, FEATURE_INDEX["BulkDensity"]]
+        tap = X[:, FEATURE_INDEX["TapDensity"]]
+        self.values = np.empty((len(X), len(CHECKS)), dtype=X.dtype)
+        for i, name in enumerate(CHECKS[:-2]):
+            self.values[:, i] = X[:, FEATURE_INDEX[name]]
+        self.values[:, -2] = carrs_index(bulk, tap)
+        self.values[:, -1] = hausners_ratio(bulk, tap)
+        self._masks = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def carrs_index(self):
+        return self.values[:, -2]
+
+    @property
+    def hausners_ratio(self):
+        return self.values[:, -1]
+
+    def check(self, benchmarks="default"):
+        if isinstance(benchmarks, str):
+            benchmarks = BENCHMARK_SETS[benchmarks]
+        key = (benchmarks.lower.tobytes(), benchmarks.upper.tobytes())
+        mask = self._masks.get(key)
+        if mask is None:
+            violated = (self.values < benchmarks.lower) | (self.values > benchmarks.upper)
+            # 10 flags per row packed little-endian into two bytes -> uint16.
+            mask = np.packbits(violated, axis=1, bitorder="little").view("<u2").ravel()
+            self._masks[key] = mask
+        return mask
+
+    def compliant(self, benchmarks="default"):
+        return self.check(benchmarks) == 0
+
+    def violation_counts(self, benchmarks="default"):
+        mask = self.check(benchmarks)
+        return {name: int(np.count_nonzero(mask & bit)) for name, bit in BITS.items()}
+
+    def flow_bands(self):
+        return flow_band(self.carrs_index, CARRS_BANDS), flow_band(self.hausners_ratio, HAUSNER_BANDS)
+
+
+def violations(mask):
+    """Names of the checks set in one sample's violation mask."""
+    return [name for name, bit in BITS.items() if mask & bit]
@@ -0,0 +1,182 @@
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+from analysis import INDUSTRY_BENCHMARKS
+
+WINDOW = 7 * 24 * 3600.0       # seconds
+BUCKETS = 28                   # window resolution: 6-hour buckets for the default week
+HALF_LIFE = 24 * 3600.0        # seconds
+PURITY_LIMIT = 40              # brand chart turns red below this score
+MIN_SAMPLES = 5
+
+# Columns of the per-bucket and decayed sums.
+COUNT, HIGH, CONTAMINATED, HEAVY, ACTIVE = range(5)
+
+
+@dataclass
+class Alert:
+    time: float
+    brand: str
+    metric: str                # "purity", "heavy" or "active"
+    scope: str                 # "window" or "decayed"
+    value: float
+    limit: float
+    breached: bool             # True when the limit is crossed, False when it recovers
+    insufficient: bool = False  # True when a breached view falls below min_samples; value is NaN
+
+
+class BrandState:
+    __slots__ = ("epochs", "buckets", "decayed", "last", "breached")
+
+    def __init__(self, buckets):
+        self.epochs = np.full(buckets, -1, dtype=np.int64)
+        self.buckets = np.zeros((buckets, 5))
+        self.decayed = np.zeros(5)
+        self.last = -math.inf
+        self.breached = {}
+
+
+def metrics(sums):
+    """Purity score, contaminated share, average heavy metal and active compound from summed columns."""
+    count = sums[COUNT]
+    if count <= 0:
+        return None
+    return {
+        "count": float(count),
+        "purity": float(100.0 * sums[HIGH] / count),
+        "contaminated": float(100.0 * sums[CONTAMINATED] / count),
+        "heavy": float(sums[HEAVY] / count),
+        "active": float(sums[ACTIVE] / count),
+    }
+
+
+class DriftMonitor:
+    """Per-brand drift tracking over a feed of timestamped, classified samples.
+
+    Each brand keeps two views in constant memory:
+    - a sliding window of ``window`` seconds, held as a ring of ``buckets``
+      partial sums, so it moves in steps of window / buckets;
+    - exponentially decayed sums with a ``half_life`` in seconds.
+
+    Both give a purity score (share in cluster 1, as computeBrandConsistency
+    scores brands), the contaminated share and the average heavy metal and
+    active compound. After each batch, every brand it touched is checked
+    against three limits:
+    - purity below ``purity_limit``;
+    - average heavy metal at or above the benchmark;
+    - average active compound at or below the benchmark.
+
+    The benchmark comparisons are isCompliant()'s, inverted. An Alert is
+    returned when a limit is crossed and again when it recovers. A view
+    needs ``min_samples`` (decayed weight, for the decayed view) before it
+    can alert. A breached view that falls below that, for example a quiet
+    brand whose window has expired, is not a recovery: it ends the breach
+    with an ``insufficient`` Alert whose value is NaN. When
+    a batch moves the clock into a new bucket, every brand is re-checked,
+    not only those in the batch.
+    """
+
+    def __init__(self, window=WINDOW, buckets=BUCKETS, half_life=HALF_LIFE, purity_limit=PURITY_LIMIT,
+                 benchmarks=INDUSTRY_BENCHMARKS, min_samples=MIN_SAMPLES):
+        self.window = window
+        self.nbuckets = buckets
+        self.width = window / buckets
+        self.half_life = half_life
+        self.min_samples = min_samples
+        self.limits = {
+            "purity": (purity_limit, lambda v, lim: v < lim),
+            "heavy": (benchmarks["HeavyMetalPpm"], lambda v, lim: v >= lim),
+            "active": (benchmarks["ActiveCompoundPct"], lambda v, lim: v <= lim),
+        }
+        self.brands = {}
+        self.now = -math.inf
+
+    def observe(self, time, brand, cluster, heavy, active):
+        return self.observe_batch([time], [brand], [cluster], [heavy], [active])
+
+    def observe_batch(self, times, brands, clusters, heavy, active):
+        """Add a batch of classified samples; returns the alerts it triggered."""
+        times = np.asarray(times, dtype=np.float64)
+        clusters = np.asarray(clusters)
+        values = np.zeros((len(times), 5))
+        values[:, COUNT] = 1.0
+        values[:, HIGH] = clusters == 1
+        values[:, CONTAMINATED] = clusters == 3
+        values[:, HEAVY] = heavy
+        values[:, ACTIVE] = active
+        previous = self.now
+        if len(times):
+            self.now = max(self.now, float(times.max()))
+
+        groups = {}
+        for i, brand in enumerate(brands):
+            groups.setdefault(brand, []).append(i)
+        alerts = []
+        for brand, rows in groups.items():
+            state = self.brands.get(brand)
+            if state is None:
+                state = self.brands[brand] = BrandState(self.nbuckets)
+            rows = np.array(rows)
+            self._add_window(state, times[rows], values[rows])
+            self._add_decayed(state, times[rows], values[rows])
+            alerts.extend(self._check(brand, state))
+        if self.now > previous and (previous == -math.inf
+                                    or math.floor(self.now / self.width) > math.floor(previous / self.width)):
+            # Buckets expired for every brand, including quiet ones.
+            for brand, state in self.brands.items():
+                if brand not in groups:
+                    alerts.extend(self._check(brand, state))
+        return alerts
+
+    def _add_window(self, state, times, values):
+        epochs = np.floor(times / self.width).astype(np.int64)
+        slots = epochs % self.nbuckets
+        # A slot is reused once a newer epoch lands in it; samples older than
+        # the epoch a slot now holds have left the window and are dropped.
+        newest = np.full(self.nbuckets, -1, dtype=np.int64)
+        np.maximum.at(newest, slots, epochs)
+        stale = newest > state.epochs
+        state.buckets[stale] = 0.0
+        state.epochs[stale] = newest[stale]
+        current = epochs == state.epochs[slots]
+        np.add.at(state.buckets, slots[current], values[current])
+
+    def _add_decayed(self, state, times, values):
+        latest = max(state.last, float(times.max()))
+        if state.last > -math.inf:
+            state.decayed *= 0.5 ** ((latest - state.last) / self.half_life)
+        state.decayed += (0.5 ** ((latest - times) / self.half_life)) @ values
+        state.last = latest
+
+    def window_sums(self, state):
+        current = math.floor(self.now / self.width)
+        live = (state.epochs > current - self.nbuckets) & (state.epochs <= current)
+        return state.buckets[live].sum(axis=0)
+
+    def decayed_sums(self, state):
+        return state.decayed * 0.5 ** ((self.now - state.last) / self.half_life)
+
+    def _check(self, brand, state):
+        alerts = []
+        for scope, sums in (("window", self.window_sums(state)), ("decayed", self.decayed_sums(state))):
+            stats = metrics(sums)
+            enough = stats is not None and stats["count"] >= self.min_samples
+            for metric, (limit, breaches) in self.limits.items():
+                was = state.breached.get((metric, scope), False)
+                if not enough:
+                    if was:
+                        state.breached[(metric, scope)] = False
+                        alerts.append(Alert(self.now, brand, metric, scope, math.nan, limit, False, insufficient=True))
+                    continue
+                breached = breaches(stats[metric], limit)
+                if breached != was:
+                    state.breached[(metric, scope)] = breached
+                    alerts.append(Alert(self.now, brand, metric, scope, stats[metric], limit, breached))
+        return alerts
+
+    def snapshot(self):
+        """{brand: {"window": metrics, "decayed": metrics}} as of the latest timestamp seen."""
+        return {brand: {"window": metrics(self.window_sums(state)), "decayed": metrics(self.decayed_sums(state))}
+                for brand, state in self.brands.items()}
@@ -0,0 +1,109 @@
+import bisect
+import re
+
+
+class OverlapError(ValueError):
+    pass
+
+
+class LiteralRules:
+    """A set of literal (old -> new) rewrites matched in a single scan.
+
+    All patterns are compiled into one alternation, longest first, so every
+    position of the buffer is visited once and the longest literal wins when
+    several start at the same offset. Hits never overlap each other: like
+    str.replace, scanning resumes after the end of each hit.
+
+    Rules are (old, new) or (old, new, name) tuples; hits are labelled with
+    the name, or with the pattern itself when no name is given.
+    """
+
+    def __init__(self, rules):
+        self.rules = {}
+        self.names = {}
+        for old, new, *name in rules:
+            if not old:
+                raise ValueError("empty pattern")
+            self.rules[old] = new
+            self.names[old] = name[0] if name else old
+        patterns = sorted(self.rules, key=len, reverse=True)
+        self._scanner = re.compile("|".join(map(re.escape, patterns))) if patterns else None
+
+    def finditer(self, content):
+        if self._scanner is None:
+            return
+        for m in self._scanner.finditer(content):
+            yield m.start(), m.end(), m.group()
+
+    def apply(self, content):
+        plan = EditPlan(content)
+        plan.add_rules(self)
+        return plan.render()
+
+
+class EditPlan:
+    """Collects rewrites of one buffer as (start, end, replacement) spans.
+
+    Offsets always refer to the original buffer, so edits can be recorded in
+    any order and the output is built once by render(). Explicit edits must
+    not overlap each other. Literal rule hits that overlap an explicit edit
+    are dropped (the explicit edit owns that region) and listed in
+    ``conflicts``.
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self.edits = []
+        self.conflicts = []
+        self._starts = []
+        self._ends = []
+        self._hits = []
+
+    def add(self, start, end, replacement, name=None):
+        if not 0 <= start <= end <= len(self.content):
+            raise ValueError(f"span ({start}, {end}) outside buffer of length {len(self.content)}")
+        i = bisect.bisect_right(self._starts, start)
+        # Neighbours in start order are the only candidates for an overlap;
+        # zero-width inserts only clash when they land strictly inside a span.
+        if i > 0 and self._ends[i - 1] > start and (start < end or self._starts[i - 1] < start):
+            raise OverlapError(f"{name or 'edit'} ({start}, {end}) overlaps {self.edits[i - 1][3] or 'edit'} ({self._starts[i - 1]}, {self._ends[i - 1]})")
+        if i < len(self._starts) and self._starts[i] < end:
+            raise OverlapError(f"{name or 'edit'} ({start}, {end}) overlaps {self.edits[i][3] or 'edit'} ({self._starts[i]}, {self._ends[i]})")
+        self._starts.insert(i, start)
+        self._ends.insert(i, end)
+        self.edits.insert(i, (start, end, replacement, name))
+
+    def add_rules(self, rules):
+        for start, end, old in rules.finditer(self.content):
+            self._hits.append((start, end, rules.rules[old], rules.names[old]))
+
+    def _overlaps_edit(self, start, end):
+        i = bisect.bisect_right(self._starts, start)
+        if i > 0 and self._ends[i - 1] > start:
+            return True
+        return i < len(self._starts) and self._starts[i] < end
+
+    def spans(self):
+        spans = list(self.edits)
+        for start, end, replacement, name in self._hits:
+            if self._overlaps_edit(start, end):
+                self.conflicts.append((start, end, name))
+            else:
+                spans.append((start, end, replacement, name))
+        self._hits = []
+        spans.sort(key=lambda s: (s[0], s[1]))
+        self.edits = spans
+        self._starts = [s[0] for s in spans]
+        self._ends = [s[1] for s in spans]
+        return spans
+
+    def render(self):
+        pieces = []
+        pos = 0
+        content = self.content
+        for start, end, replacement, _ in self.spans():
+            pieces.append(content[pos:start])
+            pieces.append(replacement)
+            pos = end
+        pieces.append(content[pos:])
+        return "".join(pieces)
@@ -0,0 +1,238 @@
+import numpy as np
+
+from analysis import ACTIVE, FEATURES, MIN_SAMPLES, AnalysisError, normalize, run_analysis, squared_distances
+from model import FittedModel
+
+
+class IncrementalClusterer:
+    """Keeps a fitted clustering current as custom samples come and go.
+
+    fit() runs run_analysis() and freezes its min/max bounds. After that,
+    add(), update() and remove() only touch the batch. Each sample is scaled
+    with the frozen bounds and assigned to the nearest centroid. Per-cluster
+    running sums then move each centroid to the mean of its members. Existing
+    members are not reassigned, so drift() tracks how far the model may have
+    strayed: the fraction of samples changed since the fit, the largest
+    centroid shift (normalized units), and how far new values overflow the
+    frozen bounds (fraction of range). Crossing any limit triggers a full
+    refit on the next change; refit() forces one.
+
+    An automatic refit that cannot run (fewer than 6 live samples, or a
+    feature with no spread) is deferred rather than raised: the change is
+    kept with incremental assignment, ``deferred_refit`` holds the reason,
+    and the refit is retried on the next change.
+    """
+
+    def __init__(self, k=3, seed=42, max_changed_fraction=0.25, max_centroid_shift=0.05,
+                 max_bound_overflow=0.1, auto_refit=True):
+        self.k = k
+        self.seed = seed
+        self.max_changed_fraction = max_changed_fraction
+        self.max_centroid_shift = max_centroid_shift
+        self.max_bound_overflow = max_bound_overflow
+        self.auto_refit = auto_refit
+        self.refits = 0
+        self.deferred_refit = None
+        self.result = None
+        self._ids = []
+        self._slot = {}
+        self._free = []
+        self._X = np.empty((0, len(FEATURES)))
+        self._labels = np.empty(0, dtype=np.int64)
+        self._alive = np.empty(0, dtype=bool)
+
+    def __len__(self):
+        return len(self._slot)
+
+    def __contains__(self, sample_id):
+        return sample_id in self._slot
+
+    # Full fits
+
+    def fit(self, ids, X):
+        ids = list(ids)
+        X = np.asarray(X, dtype=np.float64)
+        if len(set(ids)) != len(ids):
+            raise ValueError("duplicate sample IDs")
+        self._ids = ids
+        self._slot = {sample_id: i for i, sample_id in enumerate(ids)}
+        self._free = []
+        self._X = np.array(X, dtype=np.float64)
+        self._alive = np.ones(len(ids), dtype=bool)
+        return self._fit_alive()
+
+    def refit(self):
+        if self.result is None:
+            raise RuntimeError("fit() has not been called")
+        return self._fit_alive()
+
+    def _fit_alive(self):
+        rows = np.flatnonzero(self._alive)
+        result = run_analysis(self._X[rows], self.k, self.seed)
+        self.result = result
+        self.refits += 1
+        self._labels = np.zeros(len(self._alive), dtype=np.int64)
+        self._labels[rows] = result.labels
+
+        self._mins, self._maxs = result.mins, result.maxs
+        self._range = self._maxs - self._mins
+        self._lo, self._hi = self._mins.copy(), self._maxs.copy()
+        self._centroids = result.centroids.copy()
+        self._fit_centroids = result.centroids.copy()
+        self._fit_size = len(rows)
+        self._changed = 0
+        self.deferred_refit = None
+
+        labels = result.labels
+        onehot = np.eye(self.k)[labels]
+        self._counts = onehot.sum(axis=0)
+        self._raw_sums = onehot.T @ self._X[rows]
+        self._norm_sums = onehot.T @ normalize(self._X[rows], self._mins, self._maxs)
+        self._index_to_id = dict(result.index_to_id)
+        return result
+
+    # Incremental updates
+
+    def add(self, ids, X):
+        ids = list(ids)
+        X = np.asarray(X, dtype=np.float64).reshape(len(ids), len(FEATURES))
+        if any(sample_id in self._slot for sample_id in ids):
+            raise ValueError("sample ID already present; use update()")
+        if len(set(ids)) != len(ids):
+            raise ValueError("duplicate sample IDs")
+        self._require_fit()
+        slots = self._allocate(ids)
+        self._X[slots] = X
+        self._assign(slots)
+        self._changed += len(ids)
+        return self._after_change(slots)
+
+    def update(self, ids, X):
+        ids = list(ids)
+        X = np.asarray(X, dtype=np.float64).reshape(len(ids), len(FEATURES))
+        self._require_fit()
+        slots = np.array([self._slot[sample_id] for sample_id in ids], dtype=np.int64)
+        self._unassign(slots)
+        self._X[slots] = X
+        self._assign(slots)
+        self._changed += len(ids)
+        return self._after_change(slots)
+
+    def remove(self, ids):
+        ids = list(ids)
+        self._require_fit()
+        missing = [sample_id for sample_id in ids if sample_id not in self._slot]
+        if missing:
+            raise KeyError(missing[0])
+        slots = np.array([self._slot.pop(sample_id) for sample_id in ids], dtype=np.int64)
+        self._unassign(slots)
+        self._alive[slots] = False
+        for slot in slots:
+            self._ids[slot] = None
+        self._free.extend(slots.tolist())
+        self._changed += len(slots)
+        self._after_change(slots[:0])
+
+    def clusters(self, ids=None):
+        """ClusterId (1, 2 or 3) for the given IDs, or for every sample in slot order."""
+        lookup = np.array([self._index_to_id[i] for i in range(self.k)], dtype=np.int8)
+        if ids is None:
+            return lookup[self._labels[self._alive]]
+        return lookup[self._labels[[self._slot[sample_id] for sample_id in ids]]]
+
+    def ids(self):
+        return [sample_id for sample_id in self._ids if sample_id is not None]
+
+    def model(self):
+        """Current centroids, frozen bounds and ClusterId map as a FittedModel."""
+        self._require_fit()
+        return FittedModel(self._centroids, self._mins, self._maxs, self._index_to_id)
+
+    def drift(self):
+        shift = np.sqrt(((self._centroids - self._fit_centroids) ** 2).sum(axis=1)).max()
+        overflow = np.maximum(self._mins - self._lo, self._hi - self._maxs) / self._range
+        return {
+            "changed_fraction": self._changed / max(self._fit_size, 1),
+            "centroid_shift": float(shift),
+            "bound_overflow": float(overflow.max()),
+        }
+
+    def needs_refit(self):
+        drift = self.drift()
+        return (drift["changed_fraction"] > self.max_changed_fraction
+                or drift["centroid_shift"] > self.max_centroid_shift
+                or drift["bound_overflow"] > self.max_bound_overflow)
+
+    # Internals
+
+    def _require_fit(self):
+        if self.result is None:
+            raise RuntimeError("fit() has not been called")
+
+    def _allocate(self, ids):
+        slots = []
+        for sample_id in ids:
+            if self._free:
+                slot = self._free.pop()
+                self._ids[slot] = sample_id
+            else:
+                slot = len(self._ids)
+                self._ids.append(sample_id)
+            self._slot[sample_id] = slot
+            slots.append(slot)
+        needed = len(self._ids)
+        if needed > len(self._alive):
+            capacity = max(needed, 2 * len(self._alive))
+            self._X = np.resize(self._X, (capacity, len(FEATURES)))
+            self._labels = np.resize(self._labels, capacity)
+            self._alive = np.concatenate([self._alive, np.zeros(capacity - len(self._alive), dtype=bool)])
+        slots = np.array(slots, dtype=np.int64)
+        self._alive[slots] = True
+        return slots
+
+    def _assign(self, slots):
+        X = self._X[slots]
+        np.minimum(self._lo, X.min(axis=0, initial=np.inf), out=self._lo)
+        np.maximum(self._hi, X.max(axis=0, initial=-np.inf), out=self._hi)
+        scaled = normalize(X, self._mins, self._maxs)
+        labels = squared_distances(scaled, self._centroids).argmin(axis=1)
+        self._labels[slots] = labels
+        onehot = np.eye(self.k)[labels]
+        self._counts += onehot.sum(axis=0)
+        self._raw_sums += onehot.T @ X
+        self._norm_sums += onehot.T @ scaled
+
+    def _unassign(self, slots):
+        X = self._X[slots]
+        onehot = np.eye(self.k)[self._labels[slots]]
+        self._counts -= onehot.sum(axis=0)
+        self._raw_sums -= onehot.T @ X
+        self._norm_sums -= onehot.T @ normalize(X, self._mins, self._maxs)
+
+    def _try_refit(self):
+        if len(self._slot) < MIN_SAMPLES:
+            self.deferred_refit = f"{len(self._slot)} live samples, {MIN_SAMPLES} needed"
+            return False
+        try:
+            self._fit_alive()
+        except AnalysisError as e:
+            self.deferred_refit = str(e)
+            return False
+        return True
+
+    def _after_change(self, slots):
+        nonempty = self._counts > 0
+        self._centroids[nonempty] = self._norm_sums[nonempty] / self._counts[nonempty, None]
+        refitted = False
+        if self.auto_refit and self.needs_refit():
+            refitted = self._try_refit()
+        if not refitted:
+            # Same ordering rule as relabel(): descending average active compound.
+            avg_active = np.divide(self._raw_sums[:, ACTIVE], self._counts,
+                                   out=np.zeros(self.k), where=nonempty)
+            order = sorted(range(self.k), key=lambda idx: -avg_active[idx])
+            self._index_to_id = {idx: rank + 1 for rank, idx in enumerate(order)}
+        if len(slots) == 0:
+            return np.empty(0, dtype=np.int8)
+        lookup = np.array([self._index_to_id[i] for i in range(self.k)], dtype=np.int8)
+        return lookup[self._labels[slots]]
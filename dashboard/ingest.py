@@ -0,0 +1,205 @@
+import argparse
+import itertools
+import re
+import sys
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from analysis import CLUSTER_LABELS, FEATURES, AnalysisError, run_analysis
+from samplestore import SampleStore
+
+CHUNK_ROWS = 65536
+INVALID = "Please fill all 10 numerical fields correctly (non-negative numbers)."
+
+# Leading number as parseFloat() reads it; anything after it is ignored.
+_PARSE_FLOAT = re.compile(r"\s*([+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)")
+_POSITIVE = np.array([name in ("BulkDensity", "TapDensity") for name in FEATURES])
+
+
+@dataclass
+class RowError:
+    line: int
+    message: str
+
+
+@dataclass
+class Chunk:
+    lines: np.ndarray          # 1-based line number of each valid row
+    brands: np.ndarray         # object array of Brand strings
+    X: np.ndarray              # (n, 10) features in FEATURES order
+    errors: list = field(default_factory=list)
+
+
+def split_row(line):
+    # parsePastedData: split on tab or comma, trim, drop empty fields.
+    parts = list(map(str.strip, line.replace("\t", ",").split(",")))
+    return parts if "" not in parts else [part for part in parts if part]
+
+
+def parse_float(text):
+    m = _PARSE_FLOAT.match(text)
+    return float(m.group(1)) if m else np.nan
+
+
+def _parse_numbers(cells):
+    # cells holds the 10 numeric fields of every row, flattened.
+    try:
+        X = np.array(cells, dtype=np.float64)
+    except ValueError:
+        # Some cell is not a plain number: fall back to parseFloat() semantics
+        # for this chunk, so "12.5%" reads as 12.5 and "abc" as NaN.
+        X = np.array([parse_float(value) for value in cells], dtype=np.float64)
+    return X.reshape(-1, len(FEATURES))
+
+
+def _row_message(values):
+    bad = [name for name, value in zip(FEATURES, values) if not np.isfinite(value)]
+    if bad:
+        return f"{INVALID} Not a number: {', '.join(bad)}."
+    bad = [name for name, value, positive in zip(FEATURES, values, _POSITIVE)
+           if (value <= 0 if positive else value < 0)]
+    return f"{INVALID} Out of range: {', '.join(bad)}."
+
+
+def parse_chunk(lines, first_line=1):
+    """Parse and validate one chunk of pasted-format rows.
+
+    Rows are checked like handleAdd/handleSave: Brand must not be empty, and
+    all 10 values must be non-negative numbers, with Bulk and Tap density > 0.
+    Infinite values are rejected too. Rows that fail are reported in
+    ``errors`` and left out. Blank lines are skipped.
+    """
+    cells = []
+    brands = []
+    line_numbers = []
+    errors = []
+    for lineno, line in enumerate(lines, first_line):
+        parts = split_row(line)
+        if not parts:
+            continue
+        if len(parts) < 1 + len(FEATURES):
+            errors.append(RowError(lineno, f"Expected at least 11 values, got {len(parts)}. Check format."))
+            continue
+        brands.append(parts[0])
+        cells.extend(parts[1:1 + len(FEATURES)])
+        line_numbers.append(lineno)
+
+    X = _parse_numbers(cells)
+    brands = np.array(brands, dtype=object)
+    line_numbers = np.array(line_numbers, dtype=np.int64)
+
+    finite = np.isfinite(X).all(axis=1)
+    in_range = np.where(_POSITIVE, X > 0, X >= 0).all(axis=1)
+    valid = finite & in_range
+    for i in np.flatnonzero(~valid):
+        errors.append(RowError(int(line_numbers[i]), _row_message(X[i])))
+    errors.sort(key=lambda e: e.line)
+    return Chunk(line_numbers[valid], brands[valid], X[valid], errors)
+
+
+def _is_header(line):
+    parts = split_row(line)
+    return len(parts) > 1 and np.isnan(parse_float(parts[1]))
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS, header="auto"):
+    """Yield a parsed Chunk for every ``chunk_rows`` lines of a CSV/TSV file.
+
+    Only one chunk of raw lines is held in memory at a time. With
+    header="auto", the first line is skipped when its second field is not a
+    number.
+    """
+    with open(path, "r", newline="") as f:
+        lineno = 1
+        if header:
+            first = f.readline()
+            if header == "auto" and not _is_header(first):
+                yield parse_chunk([first], 1)
+            lineno = 2
+        while True:
+            lines = list(itertools.islice(f, chunk_rows))
+            if not lines:
+                break
+            yield parse_chunk(lines, lineno)
+            lineno += len(lines)
+
+
+@dataclass
+class IngestResult:
+    sample_ids: np.ndarray
+    brands: np.ndarray
+    X: np.ndarray
+    lines: np.ndarray
+    errors: list
+    rows: int
+
+    def store(self, dtype=np.float64):
+        return SampleStore.from_features(self.sample_ids, self.brands, self.X, dtype)
+
+
+def custom_ids(start, count):
+    # nextId() in the dashboard: C-001, C-002, ...
+    return np.array([f"C-{n:03d}" for n in range(start, start + count)])
+
+
+def ingest(path, chunk_rows=CHUNK_ROWS, header="auto", first_id=1, max_errors=None):
+    """Read a whole file into one feature matrix; invalid rows go to ``errors``.
+
+    Valid rows get custom IDs from ``first_id`` on, in file order. With
+    ``max_errors``, only the first that many errors are kept (``rows`` still
+    counts every non-blank row).
+    """
+    brands, matrices, lines, errors = [], [], [], []
+    rows = 0
+    for chunk in iter_chunks(path, chunk_rows, header):
+        brands.append(chunk.brands)
+        matrices.append(chunk.X)
+        lines.append(chunk.lines)
+        rows += len(chunk.X) + len(chunk.errors)
+        if max_errors is None or len(errors) < max_errors:
+            errors.extend(chunk.errors[:None if max_errors is None else max_errors - len(errors)])
+    X = np.concatenate(matrices) if matrices else np.empty((0, len(FEATURES)))
+    return IngestResult(
+        sample_ids=custom_ids(first_id, len(X)),
+        brands=np.concatenate(brands) if brands else np.empty(0, dtype=object),
+        X=X,
+        lines=np.concatenate(lines) if lines else np.empty(0, dtype=np.int64),
+        errors=errors,
+        rows=rows,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate and load instrument CSV/TSV exports (Brand + 10 values per row).")
+    parser.add_argument("path")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help=f"lines parsed per chunk (default: {CHUNK_ROWS})")
+    parser.add_argument("--no-header", action="store_true", help="never treat the first line as a header")
+    parser.add_argument("--first-id", type=int, default=1, help="number of the first C- sample ID (default: 1)")
+    parser.add_argument("--store", metavar="DIR", help="save the valid rows as a SampleStore")
+    parser.add_argument("--analyze", action="store_true", help="cluster the valid rows and print the cluster sizes")
+    parser.add_argument("--show-errors", type=int, default=20, metavar="N", help="print the first N row errors (default: 20)")
+    args = parser.parse_args(argv)
+
+    result = ingest(args.path, args.chunk_rows, header=False if args.no_header else "auto", first_id=args.first_id)
+    for error in result.errors[:args.show_errors]:
+        print(f"line {error.line}: {error.message}", file=sys.stderr)
+    print(f"{len(result.X)} of {result.rows} rows valid, {len(result.errors)} rejected")
+
+    if args.store:
+        result.store().save(args.store)
+    if args.analyze:
+        try:
+            analysis = run_analysis(result.X)
+        except AnalysisError as e:
+            print(e, file=sys.stderr)
+            return 1
+        counts = np.bincount(analysis.clusters, minlength=4)[1:]
+        active = analysis.avg_active[sorted(analysis.index_to_id, key=analysis.index_to_id.get)]
+        for cluster_id, (count, avg) in enumerate(zip(counts, active), 1):
+            print(f"Cluster {cluster_id} ({CLUSTER_LABELS[cluster_id]}): {count} samples, avg active {avg:.1f}%")
+    return 1 if result.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
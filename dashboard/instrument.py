@@ -0,0 +1,247 @@
+import argparse
+import collections
+import json
+import os
+import signal
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:            # Windows
+    resource = None
+
+PREFIX = "drugsecure"
+PROFILE_INTERVAL = 0.005       # seconds of CPU time between profiler samples
+
+_active = None
+_idle = nullcontext()
+
+
+def stage(name):
+    """Time a block under ``name`` when a PipelineMetrics is recording; a no-op otherwise."""
+    return _idle if _active is None else _active.stage(name)
+
+
+def observe(name, value):
+    if _active is not None:
+        _active.values[name] = value
+
+
+def max_rss_bytes():
+    """Peak resident set size of this process so far, or None where getrusage is unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class PipelineMetrics:
+    """Stage timings and counters of analysis runs.
+
+    While recording() is active, the pipeline's stage() blocks add their
+    wall time here:
+    - normalize;
+    - kmeans.seed and kmeans.iterate;
+    - relabel;
+    - aggregates and brand_scoring.
+
+    run_analysis() observe()s the sample count and the k-means iteration
+    count, final centroid shift and convergence. Everything recorded in one
+    recording() block is one run. snapshot() returns that run with the
+    total time, samples per second and the process memory high-water mark.
+    Hand it to an exporter.
+
+    Outside recording() the hooks cost one global lookup each, so the
+    pipeline is always instrumented and only pays when asked.
+    """
+
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        self.stages = {}
+        self.values = {}
+        self.seconds = 0.0
+        self.started = None
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.stages.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += time.perf_counter() - started
+
+    @contextmanager
+    def recording(self):
+        global _active
+        if _active is not None:
+            raise RuntimeError("another PipelineMetrics is already recording")
+        self.stages, self.values = {}, {}
+        self.started = time.time()
+        began = time.perf_counter()
+        _active = self
+        if self.profiler:
+            self.profiler.start()
+        try:
+            yield self
+        finally:
+            if self.profiler:
+                self.profiler.stop()
+            _active = None
+            self.seconds = time.perf_counter() - began
+
+    def snapshot(self):
+        samples = self.values.get("samples", 0)
+        return {
+            "time": self.started,
+            "seconds": self.seconds,
+            "samples": samples,
+            "samples_per_second": samples / self.seconds if self.seconds > 0 else 0.0,
+            "max_rss_bytes": max_rss_bytes(),
+            "stages": {name: {"calls": calls, "seconds": seconds} for name, (calls, seconds) in self.stages.items()},
+            "values": {name: value for name, value in self.values.items() if name != "samples"},
+        }
+
+
+class JsonLinesExporter:
+    """Appends one JSON object per snapshot, for trend tracking across runs."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, snapshot):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(snapshot, sort_keys=True) + "\n")
+
+
+class PrometheusExporter:
+    """Writes the latest snapshot as a Prometheus text file (node_exporter textfile collector).
+
+    The file is replaced atomically so the collector never reads a partial
+    write.
+    """
+
+    def __init__(self, path, prefix=PREFIX):
+        self.path = path
+        self.prefix = prefix
+
+    def render(self, snapshot):
+        p = self.prefix
+        lines = []
+
+        def gauge(name, help_text, samples):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} gauge")
+            for labels, value in samples:
+                lines.append(f"{p}_{name}{labels} {float(value)!r}")
+
+        stages = snapshot["stages"]
+        gauge("stage_seconds", "Wall time per analysis stage in the last run.",
+              [(f'{{stage="{name}"}}', s["seconds"]) for name, s in stages.items()])
+        gauge("stage_calls", "Calls per analysis stage in the last run.",
+              [(f'{{stage="{name}"}}', s["calls"]) for name, s in stages.items()])
+        gauge("run_seconds", "Wall time of the last run.", [("", snapshot["seconds"])])
+        gauge("samples", "Samples analysed in the last run.", [("", snapshot["samples"])])
+        gauge("samples_per_second", "Throughput of the last run.", [("", snapshot["samples_per_second"])])
+        if snapshot["max_rss_bytes"] is not None:
+            gauge("max_rss_bytes", "Peak resident set size of the process.", [("", snapshot["max_rss_bytes"])])
+        for name, value in sorted(snapshot["values"].items()):
+            if isinstance(value, (bool, int, float)):
+                gauge(name, f"Last observed {name}.", [("", value)])
+        return "\n".join(lines) + "\n"
+
+    def export(self, snapshot):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.render(snapshot))
+        os.replace(tmp, self.path)
+
+
+class SamplingProfiler:
+    """Statistical profiler for the main thread, driven by SIGPROF.
+
+    Every ``interval`` seconds of process CPU time, it records the Python
+    stack of the main thread. Time spent inside NumPy is charged to the
+    Python line that called it. folded() gives the collapsed-stack format
+    used by flamegraph.pl and speedscope. It is Unix only; it must be
+    started from the main thread.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.counts = collections.Counter()
+        self._previous = None
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        self.counts[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._previous = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous or signal.SIG_DFL)
+
+    def folded(self):
+        return [f"{stack} {count}" for stack, count in self.counts.most_common()]
+
+    def save(self, path):
+        with open(path, "w") as f:
+            f.writelines(line + "\n" for line in self.folded())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the analysis pipeline on a file and export its metrics.")
+    parser.add_argument("path", help="SampleStore directory or CSV/TSV export")
+    parser.add_argument("--repeat", type=int, default=1, help="runs to record (default: 1)")
+    parser.add_argument("--jsonl", help="append one JSON line per run here")
+    parser.add_argument("--prom", help="write the last run as a Prometheus text file here")
+    parser.add_argument("--profile", help="sample the runs and write folded stacks here")
+    args = parser.parse_args(argv)
+
+    from aggregates import Aggregates
+    from analysis import run_analysis
+
+    if os.path.isdir(args.path):
+        from samplestore import SampleStore
+        store = SampleStore.load(args.path)
+        X, brands, names = store.features(), store.codes["Brand"], store.dictionaries["Brand"].values
+    else:
+        from ingest import ingest
+        loaded = ingest(args.path)
+        X, brands, names = loaded.X, loaded.brands, None
+
+    profiler = SamplingProfiler() if args.profile else None
+    exporters = [JsonLinesExporter(args.jsonl)] if args.jsonl else []
+    if args.prom:
+        exporters.append(PrometheusExporter(args.prom))
+    metrics = PipelineMetrics(profiler)
+    for _ in range(args.repeat):
+        with metrics.recording():
+            result = run_analysis(X)
+            Aggregates.build(brands, X, result.clusters, names=names).brand_consistency()
+        snapshot = metrics.snapshot()
+        for exporter in exporters:
+            exporter.export(snapshot)
+        stages = "  ".join(f"{name} {s['seconds'] * 1000:.1f}ms" for name, s in snapshot["stages"].items())
+        print(f"{snapshot['samples']} samples in {snapshot['seconds']:.3f}s "
+              f"({snapshot['samples_per_second']:.0f}/s), {snapshot['values'].get('kmeans_iterations')} iterations: "
+              f"{stages}")
+    if profiler:
+        profiler.save(args.profile)
+    return 0
+
+
+if __name__ == "__main__":
+    # The pipeline's hooks live in the imported module, not in __main__.
+    import instrument
+    sys.exit(instrument.main())
@@ -0,0 +1,179 @@
+import re
+
+OPEN = "open"
+CLOSE = "close"
+SELF_CLOSING = "self-closing"
+
+# Each mode only stops on the characters that can change its state; the
+# regex engine skips everything in between.
+_JS = re.compile(r"""//|/\*|['"`{}<]""")
+_TAG = re.compile(r"""['"{]|/>|>""")
+_CHILDREN = re.compile(r"[{<]")
+_TEMPLATE = re.compile(r"\\|`|\$\{")
+_STRING = {
+    "'": re.compile(r"'(?:[^'\\\n]|\\.)*'?"),
+    '"': re.compile(r'"(?:[^"\\\n]|\\.)*"?'),
+}
+_TAG_NAME = re.compile(r"<\s*([A-Za-z_$][\w.$:-]*)?")
+_CLOSE_TAG = re.compile(r"</\s*([A-Za-z_$][\w.$:-]*)?\s*>")
+
+# A `<` in code starts JSX only after one of these (or `return`); otherwise
+# it is a comparison or a TypeScript generic such as useState<string>.
+_JSX_PREV = set("(,=?:&|{}[;>!")
+# Type parameters of a generic arrow function, which .tsx files must write
+# as <T,> or <T extends U> to tell them apart from a <T> element.
+_TYPE_PARAMS = re.compile(r"<\s*(?:const\s+)?[A-Za-z_$][\w$]*\s*(?:,|extends\s+(?![=>/]))")
+
+
+class TagIndex:
+    """Offsets of every JSX open, close and self-closing tag in one file.
+
+    The file is tokenized once. String literals, comments and template
+    literals are skipped, so a `<div` inside them is not a tag. Opening tags
+    are paired with their closing tags using a stack, so end_of() is a dict
+    lookup for any element start offset.
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self.tags = []
+        self.match = {}
+        self._scan()
+
+    def end_of(self, start):
+        return self.match.get(start, -1)
+
+    def _starts_jsx(self, i):
+        nxt = self.content[i + 1:i + 2]
+        if not (nxt.isalpha() or nxt in ("_", "$", ">")) or _TYPE_PARAMS.match(self.content, i):
+            return False
+        j = i - 1
+        while j >= 0 and self.content[j].isspace():
+            j -= 1
+        if j < 0 or self.content[j] in _JSX_PREV:
+            return True
+        return self.content[max(0, j - 5):j + 1] == "return"
+
+    def _skip_string(self, i):
+        return _STRING[self.content[i]].match(self.content, i).end()
+
+    def _open_tag(self, stack, i):
+        m = _TAG_NAME.match(self.content, i)
+        name = m.group(1) or ""
+        if not name and self.content.startswith(">", m.end()):
+            # Fragment <>
+            self.tags.append((i, m.end() + 1, OPEN, ""))
+            stack.append(["children", "", i])
+            return m.end() + 1
+        stack.append(["tag", name, i])
+        return m.end()
+
+    def _close_tag(self, stack, i):
+        m = _CLOSE_TAG.match(self.content, i)
+        if m is None:
+            return i + 2
+        name = m.group(1) or ""
+        self.tags.append((i, m.end(), CLOSE, name))
+        # Unwind to the nearest open element of the same name; a stray
+        # closer with no such element is recorded but left unpaired.
+        k = len(stack) - 1
+        while k > 0 and stack[k][0] == "children":
+            if stack[k][1] == name:
+                self.match[stack[k][2]] = m.end()
+                del stack[k:]
+                break
+            k -= 1
+        return m.end()
+
+    def _scan(self):
+        content = self.content
+        n = len(content)
+        stack = [["js", 0]]
+        pos = 0
+        while pos < n:
+            frame = stack[-1]
+            mode = frame[0]
+
+            if mode == "js":
+                m = _JS.search(content, pos)
+                if m is None:
+                    break
+                tok, i = m.group(), m.start()
+                if tok == "//":
+                    end = content.find("\n", i)
+                    pos = n if end == -1 else end + 1
+                elif tok == "/*":
+                    end = content.find("*/", i + 2)
+                    pos = n if end == -1 else end + 2
+                elif tok in _STRING:
+                    pos = self._skip_string(i)
+                elif tok == "`":
+                    stack.append(["template"])
+                    pos = i + 1
+                elif tok == "{":
+                    frame[1] += 1
+                    pos = i + 1
+                elif tok == "}":
+                    if frame[1] == 0 and len(stack) > 1:
+                        stack.pop()
+                    elif frame[1] > 0:
+                        frame[1] -= 1
+                    pos = i + 1
+                elif self._starts_jsx(i):
+                    pos = self._open_tag(stack, i)
+                else:
+                    pos = i + 1
+
+            elif mode == "tag":
+                m = _TAG.search(content, pos)
+                if m is None:
+                    break
+                tok, i = m.group(), m.start()
+                if tok in _STRING:
+                    pos = self._skip_string(i)
+                elif tok == "{":
+                    stack.append(["js", 0])
+                    pos = i + 1
+                elif tok == "/>":
+                    _, name, start = stack.pop()
+                    self.tags.append((start, i + 2, SELF_CLOSING, name))
+                    self.match[start] = i + 2
+                    pos = i + 2
+                else:
+                    _, name, start = frame
+                    self.tags.append((start, i + 1, OPEN, name))
+                    stack[-1] = ["children", name, start]
+                    pos = i + 1
+
+            elif mode == "children":
+                m = _CHILDREN.search(content, pos)
+                if m is None:
+                    break
+                i = m.start()
+                if m.group() == "{":
+                    stack.append(["js", 0])
+                    pos = i + 1
+                elif content.startswith("</", i):
+                    pos = self._close_tag(stack, i)
+                elif self._starts_child_tag(i):
+                    pos = self._open_tag(stack, i)
+                else:
+                    pos = i + 1
+
+            else:
+                m = _TEMPLATE.search(content, pos)
+                if m is None:
+                    break
+                tok, i = m.group(), m.start()
+                if tok == "\\":
+                    pos = i + 2
+                elif tok == "`":
+                    stack.pop()
+                    pos = i + 1
+                else:
+                    stack.append(["js", 0])
+                    pos = i + 2
+
+    def _starts_child_tag(self, i):
+        nxt = self.content[i + 1:i + 2]
+        return nxt.isalpha() or nxt in ("_", "$", ">")
@@ -0,0 +1,135 @@
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from analysis import CLUSTER_LABELS, FEATURES, feature_matrix
+from ingest import CHUNK_ROWS, iter_chunks
+
+MODEL_VERSION = 1
+BATCH_ROWS = 65536
+
+
+class FittedModel:
+    """What a finished handleRunAnalysis fit needs to label new samples.
+
+    It holds the centroids (in normalized space), the min/max bounds of the
+    fit and the k-means index -> ClusterId map (indexToIdMap). classify()
+    scales and assigns new rows without refitting. Min-max scaling is folded
+    into the distance computation, so that
+        ||(x - mins) / range - c||^2 = ||x'||^2 + x . w_c + b_c.
+    The ||x'||^2 term is the same for every centroid and drops out of the
+    argmin. Assigning a batch is then one (n, 10) x (10, k) matmul plus a
+    bias.
+    """
+
+    def __init__(self, centroids, mins, maxs, index_to_id, features=FEATURES):
+        self.centroids = np.asarray(centroids, dtype=np.float64)
+        self.mins = np.asarray(mins, dtype=np.float64)
+        self.maxs = np.asarray(maxs, dtype=np.float64)
+        self.index_to_id = {int(i): int(c) for i, c in index_to_id.items()}
+        self.features = tuple(features)
+        k = len(self.centroids)
+        self.lookup = np.array([self.index_to_id[i] for i in range(k)], dtype=np.int8)
+
+        scaled = self.centroids / (self.maxs - self.mins)
+        self._weights = -2.0 * scaled.T
+        self._bias = (self.centroids ** 2).sum(axis=1) + 2.0 * self.mins @ scaled.T
+
+    @classmethod
+    def from_result(cls, result):
+        """Model of an AnalysisResult (run_analysis, run_multistart, ResultCache)."""
+        return cls(result.centroids, result.mins, result.maxs, result.index_to_id)
+
+    @property
+    def k(self):
+        return len(self.centroids)
+
+    def scores(self, X):
+        """Squared distance to each centroid in normalized space, minus the per-row ||x'||^2."""
+        return X @ self._weights + self._bias
+
+    def classify(self, X, batch_rows=BATCH_ROWS):
+        """ClusterId (int8) for every row of an (n, 10) feature matrix."""
+        X = np.asarray(X)
+        out = np.empty(len(X), dtype=np.int8)
+        for start in range(0, len(X), batch_rows):
+            block = X[start:start + batch_rows]
+            out[start:start + len(block)] = self.lookup[self.scores(block).argmin(axis=1)]
+        return out
+
+    def classify_samples(self, samples):
+        """AnalyzedSample dicts for Sample dicts, as analyze_samples() returns them."""
+        clusters = self.classify(feature_matrix(samples))
+        return [dict(s, Cluster=int(c)) for s, c in zip(samples, clusters)]
+
+    def to_dict(self):
+        return {
+            "version": MODEL_VERSION,
+            "features": list(self.features),
+            "centroids": self.centroids.tolist(),
+            "mins": self.mins.tolist(),
+            "maxs": self.maxs.tolist(),
+            "index_to_id": {str(i): c for i, c in self.index_to_id.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != MODEL_VERSION:
+            raise ValueError(f"unsupported model version {data.get('version')}")
+        if tuple(data["features"]) != FEATURES:
+            raise ValueError("model was fitted on a different feature list")
+        return cls(data["centroids"], data["mins"], data["maxs"], data["index_to_id"], data["features"])
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a fitted model, or label CSV/TSV rows with one.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fit = sub.add_parser("fit", help="run the analysis on a SampleStore or CSV/TSV file and export the model")
+    fit.add_argument("path")
+    fit.add_argument("-o", "--output", default="model.json")
+    classify = sub.add_parser("classify", help="label every valid row of a CSV/TSV file")
+    classify.add_argument("model")
+    classify.add_argument("path")
+    classify.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    classify.add_argument("-o", "--output", help="write line,Brand,ClusterId rows here")
+    args = parser.parse_args(argv)
+
+    if args.command == "fit":
+        from analysis import run_analysis
+        from multistart import load_features
+        FittedModel.from_result(run_analysis(load_features(args.path))).save(args.output)
+        return 0
+
+    model = FittedModel.load(args.model)
+    counts = np.zeros(model.k + 1, dtype=np.int64)
+    rejected = 0
+    out = open(args.output, "w") if args.output else None
+    try:
+        for chunk in iter_chunks(args.path, args.chunk_rows):
+            clusters = model.classify(chunk.X)
+            counts += np.bincount(clusters, minlength=model.k + 1)
+            rejected += len(chunk.errors)
+            if out:
+                out.writelines(f"{line},{brand},{c}\n" for line, brand, c in zip(chunk.lines, chunk.brands, clusters))
+    finally:
+        if out:
+            out.close()
+    for cluster_id in range(1, model.k + 1):
+        print(f"Cluster {cluster_id} ({CLUSTER_LABELS.get(cluster_id, '-')}): {counts[cluster_id]}")
+    print(f"{rejected} rows rejected")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+import argparse
+import multiprocessing
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+
+from analysis import (ACTIVE, CLUSTER_LABELS, KMeansResult, analysis_result, feature_bounds, kmeans, normalize,
+                      relabel, squared_distances)
+
+SILHOUETTE_SAMPLE = 2000
+
+_X = None
+
+
+def _init_worker(X):
+    global _X
+    _X = X
+
+
+def _fit(args):
+    # Only the centroids and scores travel back; labels are recomputed for
+    # the winning fit, so restarts on large n don't pickle n labels each.
+    k, seed, max_iter, tol = args
+    result = kmeans(_X, k, seed, max_iter, tol)
+    return k, seed, result.centroids, result.inertia, result.iterations, result.delta, result.converged
+
+
+@dataclass
+class Candidate:
+    k: int
+    seed: int
+    inertia: float
+    iterations: int
+    converged: bool
+
+
+@dataclass
+class KSummary:
+    k: int
+    seed: int                  # restart with the lowest inertia for this k
+    inertia: float
+    silhouette: float
+    active_gap: float          # smallest gap in average active compound between clusters
+    low_separation: bool
+
+
+@dataclass
+class MultiStartResult:
+    result: object             # AnalysisResult of the chosen k
+    k: int
+    seed: int
+    candidates: list
+    summaries: list
+
+
+def silhouette(X, labels, k, sample_size=SILHOUETTE_SAMPLE, seed=0):
+    """Mean silhouette coefficient, computed on at most ``sample_size`` rows.
+
+    The rows are drawn with default_rng(seed), so the score is
+    deterministic. Samples that are alone in their cluster score 0, and
+    clusters with no sampled rows are left out of the nearest-cluster
+    distance.
+    """
+    if len(X) > sample_size:
+        rows = np.sort(np.random.default_rng(seed).choice(len(X), sample_size, replace=False))
+        X, labels = X[rows], labels[rows]
+    distances = np.sqrt(squared_distances(X, X))
+    onehot = np.eye(k)[labels]
+    counts = onehot.sum(axis=0)
+    totals = distances @ onehot
+    own = counts[labels]
+    a = totals[np.arange(len(X)), labels] / np.maximum(own - 1, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_other = totals / counts
+    mean_other[:, counts == 0] = np.inf
+    mean_other[np.arange(len(X)), labels] = np.inf
+    b = mean_other.min(axis=1)
+    s = np.where(own > 1, (b - a) / np.maximum(a, b), 0.0)
+    return float(np.nan_to_num(s).mean())
+
+
+def active_gap(avg_active):
+    ordered = np.sort(avg_active)
+    return float(np.diff(ordered).min()) if len(ordered) > 1 else 0.0
+
+
+def run_multistart(X, ks=(3,), restarts=10, seed=42, jobs=1, max_iter=100, tol=1e-6,
+                   silhouette_sample=SILHOUETTE_SAMPLE):
+    """Best of ``restarts`` seeded k-means fits for every k in ``ks``.
+
+    Restarts use seeds seed, seed + 1, ..., so the first is the same fit as
+    run_analysis(). For each k, the lowest-inertia restart wins (ties go to
+    the lower seed). Inertia always falls as k grows, so across ks the
+    winner is the highest silhouette. Results do not depend on ``jobs``.
+    ClusterIds rank clusters by average active compound, as in
+    run_analysis(), so k=3 keeps 1 = High Purity ... 3 = Contaminated.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    mins, maxs = feature_bounds(X)
+    normalized = normalize(X, mins, maxs)
+    tasks = [(k, s, max_iter, tol) for k in ks for s in range(seed, seed + restarts)]
+
+    if jobs == 1:
+        _init_worker(normalized)
+        fits = [_fit(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(jobs or os.cpu_count(), initializer=_init_worker, initargs=(normalized,)) as pool:
+            fits = pool.map(_fit, tasks)
+
+    candidates = [Candidate(k, s, inertia, iterations, converged)
+                  for k, s, _, inertia, iterations, _, converged in fits]
+    best = {}
+    for fit in fits:
+        k, s, _, inertia = fit[:4]
+        if k not in best or inertia < best[k][3]:
+            best[k] = fit
+
+    summaries = []
+    results = {}
+    for k, s, centroids, inertia, iterations, delta, converged in (best[k] for k in ks):
+        labels = squared_distances(normalized, centroids).argmin(axis=1)
+        results[k] = KMeansResult(labels, centroids, iterations, inertia, delta, converged)
+        _, avg_active, low_separation = relabel(X[:, ACTIVE], labels, k)
+        summaries.append(KSummary(k, s, inertia, silhouette(normalized, labels, k, silhouette_sample, seed),
+                                  active_gap(avg_active), low_separation))
+
+    chosen = max(summaries, key=lambda summary: summary.silhouette) if len(summaries) > 1 else summaries[0]
+    result = analysis_result(X, mins, maxs, results[chosen.k], chosen.k)
+    return MultiStartResult(result, chosen.k, chosen.seed, candidates, summaries)
+
+
+def parse_ks(text):
+    if "-" in text:
+        low, high = text.split("-")
+        return tuple(range(int(low), int(high) + 1))
+    return tuple(int(k) for k in text.split(","))
+
+
+def load_features(path):
+    """Feature matrix from a SampleStore directory or a CSV/TSV export."""
+    if os.path.isdir(path):
+        from samplestore import SampleStore
+        return SampleStore.load(path).features()
+    from ingest import ingest
+    return ingest(path).X
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-restart, multi-k clustering with quality scores.")
+    parser.add_argument("path", help="SampleStore directory or CSV/TSV export")
+    parser.add_argument("-k", default="3", help="k values: '3', '2,3,4' or '2-5' (default: 3)")
+    parser.add_argument("--restarts", type=int, default=10, help="seeded restarts per k (default: 10)")
+    parser.add_argument("--seed", type=int, default=42, help="first seed (default: 42)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    multi = run_multistart(load_features(args.path), parse_ks(args.k), args.restarts, args.seed, args.jobs)
+    print(f"{'k':>3}  {'seed':>5}  {'inertia':>12}  {'silhouette':>10}  {'active gap':>10}")
+    for s in multi.summaries:
+        flag = "  low separation" if s.low_separation else ""
+        print(f"{s.k:>3}  {s.seed:>5}  {s.inertia:>12.4f}  {s.silhouette:>10.4f}  {s.active_gap:>10.2f}{flag}")
+    counts = np.bincount(multi.result.clusters, minlength=multi.k + 1)[1:]
+    print(f"chosen k={multi.k} (seed {multi.seed})")
+    for cluster_id, count in enumerate(counts, 1):
+        print(f"  Cluster {cluster_id} ({CLUSTER_LABELS[cluster_id] if multi.k == 3 else '-'}): {count} samples")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
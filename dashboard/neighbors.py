@@ -0,0 +1,234 @@
+import numpy as np
+
+from analysis import normalize, squared_distances
+
+LEAF_SIZE = 256                # large leaves: each visit is one NumPy call, so fewer nodes win
+MIN_REBUILD = 1024             # inserts buffered before a rebuild is considered
+REBUILD_FRACTION = 0.1         # ... and the buffer must exceed this share of the tree
+
+
+class NeighborIndex:
+    """KD-tree over min-max normalized features for k-NN and radius queries.
+
+    Every method takes raw (n, 10) feature rows and scales them with the
+    stored bounds, usually those of the analysis fit, so distances match the
+    space k-means clustered in. Results are row numbers in insertion order
+    (use ``ids`` to map them back to SampleIDs).
+
+    The tree is built over the first rows; later insert()s go into a buffer
+    that queries scan by brute force, and the tree is rebuilt once the
+    buffer outgrows MIN_REBUILD and REBUILD_FRACTION of the tree. Queries
+    walk the tree for a whole batch at once. Each node is visited at most
+    once, with the subset of queries it can still improve, so the batch
+    shares the per-node Python cost.
+    """
+
+    def __init__(self, X, mins, maxs, ids=None, leaf_size=LEAF_SIZE):
+        self.mins = np.asarray(mins, dtype=np.float64)
+        self.maxs = np.asarray(maxs, dtype=np.float64)
+        self.leaf_size = leaf_size
+        self.data = normalize(np.asarray(X, dtype=np.float64), self.mins, self.maxs)
+        self.ids = list(ids) if ids is not None else None
+        self.rows = len(self.data)
+        self._build()
+
+    @classmethod
+    def from_result(cls, X, result, ids=None, leaf_size=LEAF_SIZE):
+        """Index X in the normalized space of an AnalysisResult."""
+        return cls(X, result.mins, result.maxs, ids, leaf_size)
+
+    def __len__(self):
+        return self.rows
+
+    # Building
+
+    def _build(self):
+        n = self.rows
+        points = self.data[:n]
+        perm = np.arange(n)
+        split_dim, split_val, left, right, start, end, lo, hi = [], [], [], [], [], [], [], []
+
+        def build(a, b):
+            node = len(start)
+            pts = points[perm[a:b]]
+            box_lo, box_hi = (pts.min(axis=0), pts.max(axis=0)) if b > a else (np.zeros(points.shape[1]),) * 2
+            split_dim.append(-1)
+            split_val.append(0.0)
+            left.append(-1)
+            right.append(-1)
+            start.append(a)
+            end.append(b)
+            lo.append(box_lo)
+            hi.append(box_hi)
+            if b - a > self.leaf_size:
+                dim = int(np.argmax(box_hi - box_lo))
+                mid = (b - a) // 2
+                part = np.argpartition(pts[:, dim], mid)
+                perm[a:b] = perm[a:b][part]
+                split_dim[node] = dim
+                split_val[node] = float(pts[part[mid], dim])
+                left[node] = build(a, a + mid)
+                right[node] = build(a + mid, b)
+            return node
+
+        build(0, n)
+        self.perm = perm
+        self.points = points[perm]
+        self.split_dim = np.array(split_dim, dtype=np.int64)
+        self.split_val = np.array(split_val)
+        self.left = np.array(left, dtype=np.int64)
+        self.right = np.array(right, dtype=np.int64)
+        self.start = np.array(start, dtype=np.int64)
+        self.end = np.array(end, dtype=np.int64)
+        self.lo = np.array(lo)
+        self.hi = np.array(hi)
+        self.tree_rows = n
+
+    def insert(self, X, ids=None):
+        """Append rows; they are searchable at once and join the tree on the next rebuild."""
+        scaled = normalize(np.asarray(X, dtype=np.float64).reshape(-1, self.data.shape[1]), self.mins, self.maxs)
+        if self.rows + len(scaled) > len(self.data):
+            grown = np.empty((max(self.rows + len(scaled), 2 * len(self.data)), self.data.shape[1]))
+            grown[:self.rows] = self.data[:self.rows]
+            self.data = grown
+        self.data[self.rows:self.rows + len(scaled)] = scaled
+        first = self.rows
+        self.rows += len(scaled)
+        if self.ids is not None:
+            self.ids.extend(ids if ids is not None else [None] * len(scaled))
+        pending = self.rows - self.tree_rows
+        if pending > MIN_REBUILD and pending > REBUILD_FRACTION * self.tree_rows:
+            self._build()
+        return np.arange(first, self.rows)
+
+    def rebuild(self):
+        self._build()
+
+    # Queries
+
+    def _leaf_of(self, Q):
+        node = np.zeros(len(Q), dtype=np.int64)
+        inner = self.left[node] >= 0
+        while inner.any():
+            at = node[inner]
+            go_left = Q[inner, self.split_dim[at]] < self.split_val[at]
+            node[inner] = np.where(go_left, self.left[at], self.right[at])
+            inner = self.left[node] >= 0
+        return node
+
+    def _box_distance(self, Q, node):
+        gap = np.maximum(self.lo[node] - Q, 0.0) + np.maximum(Q - self.hi[node], 0.0)
+        return np.einsum("ij,ij->i", gap, gap)
+
+    def query(self, X, k=5):
+        """The k nearest rows to every query row: (distances, rows), each (m, k), nearest first."""
+        Q = normalize(np.asarray(X, dtype=np.float64).reshape(-1, self.data.shape[1]), self.mins, self.maxs)
+        k = min(k, self.rows)
+        best_d = np.full((len(Q), k), np.inf)
+        best_i = np.full((len(Q), k), -1, dtype=np.int64)
+
+        def merge(qs, d2, rows):
+            cand_d = np.concatenate([best_d[qs], d2], axis=1)
+            cand_i = np.concatenate([best_i[qs], np.broadcast_to(rows, d2.shape)], axis=1)
+            keep = np.argpartition(cand_d, k - 1, axis=1)[:, :k]
+            best_d[qs] = np.take_along_axis(cand_d, keep, axis=1)
+            best_i[qs] = np.take_along_axis(cand_i, keep, axis=1)
+
+        # Seed every query with the leaf it falls into, so the bound is tight
+        # before the walk starts; the walk then visits each node once for the
+        # whole batch, skipping the seed leaf per query.
+        seed = np.full(len(Q), -1, dtype=np.int64)
+        if self.tree_rows:
+            seed = self._leaf_of(Q)
+            for leaf in np.unique(seed):
+                qs = np.flatnonzero(seed == leaf)
+                a, b = self.start[leaf], self.end[leaf]
+                merge(qs, squared_distances(Q[qs], self.points[a:b]), self.perm[a:b])
+
+        def visit(node, qs):
+            qs = qs[self._box_distance(Q[qs], node) < best_d[qs].max(axis=1)]
+            if len(qs) == 0:
+                return
+            if self.left[node] < 0:
+                qs = qs[seed[qs] != node]
+                if len(qs):
+                    a, b = self.start[node], self.end[node]
+                    merge(qs, squared_distances(Q[qs], self.points[a:b]), self.perm[a:b])
+                return
+            visit(self.left[node], qs)
+            visit(self.right[node], qs)
+
+        if self.tree_rows:
+            visit(0, np.arange(len(Q)))
+        if self.rows > self.tree_rows:
+            pending = np.arange(self.tree_rows, self.rows)
+            merge(np.arange(len(Q)), squared_distances(Q, self.data[self.tree_rows:self.rows]), pending)
+
+        order = np.argsort(best_d, axis=1, kind="stable")
+        return np.sqrt(np.take_along_axis(best_d, order, axis=1)), np.take_along_axis(best_i, order, axis=1)
+
+    def query_radius(self, X, radius):
+        """Rows within ``radius`` of every query row: lists of (distances, rows), nearest first."""
+        Q = normalize(np.asarray(X, dtype=np.float64).reshape(-1, self.data.shape[1]), self.mins, self.maxs)
+        r2 = radius * radius
+        hits_q, hits_i, hits_d = [], [], []
+
+        def collect(qs, d2, rows):
+            q, j = np.nonzero(d2 <= r2)
+            hits_q.append(qs[q])
+            hits_i.append(rows[j])
+            hits_d.append(d2[q, j])
+
+        def visit(node, qs):
+            qs = qs[self._box_distance(Q[qs], node) <= r2]
+            if len(qs) == 0:
+                return
+            if self.left[node] < 0:
+                a, b = self.start[node], self.end[node]
+                collect(qs, squared_distances(Q[qs], self.points[a:b]), self.perm[a:b])
+                return
+            visit(self.left[node], qs)
+            visit(self.right[node], qs)
+
+        if self.tree_rows:
+            visit(0, np.arange(len(Q)))
+        if self.rows > self.tree_rows:
+            collect(np.arange(len(Q)), squared_distances(Q, self.data[self.tree_rows:self.rows]),
+                    np.arange(self.tree_rows, self.rows))
+
+        q = np.concatenate(hits_q) if hits_q else np.empty(0, dtype=np.int64)
+        rows = np.concatenate(hits_i) if hits_i else np.empty(0, dtype=np.int64)
+        d2 = np.concatenate(hits_d) if hits_d else np.empty(0)
+        order = np.lexsort((d2, q))
+        q, rows, d = q[order], rows[order], np.sqrt(d2[order])
+        bounds = np.searchsorted(q, np.arange(len(Q) + 1))
+        return [(d[a:b], rows[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+
+    # Persistence
+
+    def save(self, path):
+        arrays = {
+            "data": self.data[:self.rows], "mins": self.mins, "maxs": self.maxs,
+            "leaf_size": self.leaf_size, "tree_rows": self.tree_rows, "perm": self.perm,
+            "split_dim": self.split_dim, "split_val": self.split_val, "left": self.left, "right": self.right,
+            "start": self.start, "end": self.end, "lo": self.lo, "hi": self.hi,
+        }
+        if self.ids is not None:
+            arrays["ids"] = np.array(self.ids, dtype=str)
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            index = cls.__new__(cls)
+            index.mins, index.maxs = data["mins"], data["maxs"]
+            index.leaf_size = int(data["leaf_size"])
+            index.data = data["data"]
+            index.rows = len(index.data)
+            index.ids = data["ids"].tolist() if "ids" in data else None
+            index.tree_rows = int(data["tree_rows"])
+            for name in ("perm", "split_dim", "split_val", "left", "right", "start", "end", "lo", "hi"):
+                setattr(index, name, data[name])
+            index.points = index.data[:index.tree_rows][index.perm]
+        return index
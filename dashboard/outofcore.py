@@ -0,0 +1,260 @@
+import argparse
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+
+from analysis import (ACTIVE, CLUSTER_LABELS, FEATURES, MIN_SAMPLES, NO_DIVERSITY, AnalysisError, kmeans_plus_plus,
+                      normalize, rank_clusters, squared_distances)
+from instrument import observe, stage
+from model import FittedModel
+
+CHUNK_ROWS = 65536             # rows in memory at once; bounds peak memory with SAMPLE_ROWS
+SAMPLE_ROWS = 65536            # reservoir for k-means++ seeding and quantiles
+MINIBATCH_EPOCHS = 2           # mini-batch passes before the exact Lloyd passes
+LLOYD_PASSES = 100             # cap on exact Lloyd passes, as run_analysis()'s max_iter
+
+
+def iter_features(source, chunk_rows=CHUNK_ROWS):
+    """(n, 10) float64 chunks of ``source``, read one at a time.
+
+    ``source`` is an array (including a np.memmap), a SampleStore directory
+    or a .npy matrix, both memory-mapped, or a CSV/TSV export, read with
+    ingest.iter_chunks (invalid rows are skipped). Every call starts a new
+    pass.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        if os.path.isdir(path):
+            from samplestore import SampleStore
+            source = SampleStore.load(path).features()
+        elif path.endswith(".npy"):
+            source = np.load(path, mmap_mode="r")
+        else:
+            from ingest import iter_chunks
+            for chunk in iter_chunks(path, chunk_rows):
+                if len(chunk.X):
+                    yield np.asarray(chunk.X, dtype=np.float64)
+            return
+    for start in range(0, len(source), chunk_rows):
+        yield np.array(source[start:start + chunk_rows], dtype=np.float64)
+
+
+class StreamingBounds:
+    """Per-feature min/max over a stream of chunks, plus a uniform row sample.
+
+    The sample is a reservoir of ``sample_rows`` rows, filled with a
+    vectorized Algorithm R. It seeds k-means++ and gives approximate
+    quantiles (rank error about 1/sqrt(sample_rows)) for robust scaling.
+    While the stream is no longer than the reservoir, the sample is the
+    whole input in order.
+    """
+
+    def __init__(self, features=len(FEATURES), sample_rows=SAMPLE_ROWS, seed=0):
+        self.rows = 0
+        self.mins = np.full(features, np.inf)
+        self.maxs = np.full(features, -np.inf)
+        self.sample = np.empty((sample_rows, features))
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, X):
+        if len(X) == 0:
+            return
+        np.minimum(self.mins, X.min(axis=0), out=self.mins)
+        np.maximum(self.maxs, X.max(axis=0), out=self.maxs)
+        capacity = len(self.sample)
+        fill = max(0, min(capacity - self.rows, len(X)))
+        self.sample[self.rows:self.rows + fill] = X[:fill]
+        rest = X[fill:]
+        if len(rest):
+            # Row t (1-based over the whole stream) replaces a random slot with
+            # probability capacity / t; later rows overwrite earlier ones, as
+            # in the sequential algorithm.
+            t = self.rows + fill + np.arange(1, len(rest) + 1)
+            take = np.flatnonzero(self.rng.random(len(rest)) < capacity / t)
+            self.sample[self.rng.integers(capacity, size=len(take))] = rest[take]
+        self.rows += len(X)
+
+    def sampled(self):
+        return self.sample[:min(self.rows, len(self.sample))]
+
+    def bounds(self, quantile=None):
+        """(mins, maxs) for scaling: exact extremes, or the ``quantile`` / 1 - ``quantile`` sample quantiles.
+
+        Raises AnalysisError as feature_bounds() does.
+        """
+        if self.rows < MIN_SAMPLES:
+            raise AnalysisError(NO_DIVERSITY)
+        if quantile:
+            mins, maxs = np.quantile(self.sampled(), [quantile, 1.0 - quantile], axis=0)
+        else:
+            mins, maxs = self.mins.copy(), self.maxs.copy()
+        if np.any(mins == maxs):
+            raise AnalysisError(NO_DIVERSITY)
+        return mins, maxs
+
+
+@dataclass
+class OutOfCoreResult:
+    centroids: np.ndarray      # in normalized feature space
+    mins: np.ndarray
+    maxs: np.ndarray
+    index_to_id: dict
+    avg_active: np.ndarray
+    low_separation: bool
+    counts: np.ndarray         # samples per k-means index
+    rows: int
+    inertia: float
+    passes: int                # Lloyd passes run
+    delta: float
+    converged: bool
+
+    def model(self):
+        return FittedModel(self.centroids, self.mins, self.maxs, self.index_to_id)
+
+
+def minibatch_epoch(chunks, centroids, seen):
+    """One mini-batch k-means pass (Sculley, 2010) with each chunk as a batch.
+
+    Each centroid moves toward the mean of its batch members with rate
+    batch count / total count so far, so ``seen`` carries across epochs.
+    """
+    k = len(centroids)
+    identity = np.eye(k)
+    for X in chunks:
+        onehot = identity[squared_distances(X, centroids).argmin(axis=1)]
+        counts = onehot.sum(axis=0)
+        sums = onehot.T @ X
+        seen += counts
+        hit = counts > 0
+        centroids[hit] += (sums[hit] - counts[hit, None] * centroids[hit]) / seen[hit, None]
+    return centroids, seen
+
+
+def lloyd_pass(chunks, centroids):
+    """One exact Lloyd iteration, summed chunk by chunk; returns (centroids, delta)."""
+    k = len(centroids)
+    identity = np.eye(k)
+    counts = np.zeros(k)
+    sums = np.zeros_like(centroids)
+    for X in chunks:
+        onehot = identity[squared_distances(X, centroids).argmin(axis=1)]
+        counts += onehot.sum(axis=0)
+        sums += onehot.T @ X
+    updated = centroids.copy()
+    nonempty = counts > 0
+    updated[nonempty] = sums[nonempty] / counts[nonempty, None]
+    return updated, float(np.sqrt(((updated - centroids) ** 2).sum(axis=1)).max())
+
+
+def run_out_of_core(source, k=3, seed=42, chunk_rows=CHUNK_ROWS, sample_rows=SAMPLE_ROWS, quantile=None,
+                    epochs=MINIBATCH_EPOCHS, passes=LLOYD_PASSES, tol=1e-6, labels_path=None):
+    """handleRunAnalysis over data that does not fit in memory.
+
+    The passes over ``source`` are:
+    1. Streaming min/max (or sample quantiles with ``quantile``) and a
+       reservoir sample. k-means++ seeds from the sample.
+    2. ``epochs`` mini-batch k-means passes.
+    3. Up to ``passes`` exact Lloyd passes, stopping once centroids move
+       less than ``tol``.
+    4. A final assignment for relabelling and inertia. With ``labels_path``,
+       it also writes ClusterIds to an int8 .npy file there.
+
+    Only one chunk and the sample are held at a time. With no mini-batch
+    epochs, the data fitting in the reservoir and ``passes`` and ``tol``
+    equal to run_analysis()'s ``max_iter`` and ``tol`` (the defaults),
+    seeding and iterations are those of run_analysis(), so both paths give
+    the same clusters.
+    """
+    def chunks():
+        for X in iter_features(source, chunk_rows):
+            yield normalize(X, mins, maxs, out=X)
+
+    with stage("outofcore.bounds"):
+        sketch = StreamingBounds(sample_rows=sample_rows, seed=seed)
+        for X in iter_features(source, chunk_rows):
+            sketch.update(X)
+        mins, maxs = sketch.bounds(quantile)
+    observe("samples", sketch.rows)
+
+    with stage("kmeans.seed"):
+        centroids = kmeans_plus_plus(normalize(sketch.sampled(), mins, maxs), k, np.random.default_rng(seed))
+
+    with stage("outofcore.minibatch"):
+        seen = np.zeros(k)
+        for _ in range(epochs):
+            centroids, seen = minibatch_epoch(chunks(), centroids, seen)
+
+    delta, done, converged = np.inf, 0, False
+    with stage("kmeans.iterate"):
+        for done in range(1, passes + 1):
+            centroids, delta = lloyd_pass(chunks(), centroids)
+            if delta <= tol:
+                converged = True
+                break
+    observe("kmeans_iterations", done)
+    observe("kmeans_delta", delta)
+    observe("kmeans_converged", converged)
+
+    with stage("outofcore.assign"):
+        counts = np.zeros(k, dtype=np.int64)
+        active_sums = np.zeros(k)
+        inertia = 0.0
+        labels = None
+        if labels_path:
+            labels = np.lib.format.open_memmap(labels_path, mode="w+", dtype=np.int8, shape=(sketch.rows,))
+        start = 0
+        for X in iter_features(source, chunk_rows):
+            active = X[:, ACTIVE].copy()
+            d2 = squared_distances(normalize(X, mins, maxs, out=X), centroids)
+            index = d2.argmin(axis=1)
+            inertia += float(d2[np.arange(len(X)), index].sum())
+            counts += np.bincount(index, minlength=k)
+            active_sums += np.bincount(index, weights=active, minlength=k)
+            if labels is not None:
+                labels[start:start + len(X)] = index
+            start += len(X)
+        index_to_id, avg_active, low_separation = rank_clusters(active_sums, counts)
+        if labels is not None:
+            # Indices -> ClusterIds in place, once the ranking is known.
+            lookup = np.array([index_to_id[i] for i in range(k)], dtype=np.int8)
+            for begin in range(0, len(labels), chunk_rows):
+                labels[begin:begin + chunk_rows] = lookup[labels[begin:begin + chunk_rows]]
+            labels.flush()
+            del labels
+
+    return OutOfCoreResult(centroids, mins, maxs, index_to_id, avg_active, low_separation, counts, sketch.rows,
+                           inertia, done, delta, converged)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cluster a dataset larger than memory in chunked passes.")
+    parser.add_argument("path", help="SampleStore directory, .npy feature matrix or CSV/TSV export")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help=f"rows per chunk (default: {CHUNK_ROWS})")
+    parser.add_argument("--sample-rows", type=int, default=SAMPLE_ROWS,
+                        help=f"reservoir rows for seeding and quantiles (default: {SAMPLE_ROWS})")
+    parser.add_argument("--robust", type=float, metavar="Q",
+                        help="scale between the Q and 1-Q quantiles instead of min/max (e.g. 0.01)")
+    parser.add_argument("--epochs", type=int, default=MINIBATCH_EPOCHS, help="mini-batch passes")
+    parser.add_argument("--passes", type=int, default=LLOYD_PASSES, help="maximum exact Lloyd passes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--labels", help="write ClusterIds (int8 .npy) here")
+    parser.add_argument("--model", help="export the fitted model (model.py JSON) here")
+    args = parser.parse_args(argv)
+
+    result = run_out_of_core(args.path, chunk_rows=args.chunk_rows, sample_rows=args.sample_rows,
+                             quantile=args.robust, epochs=args.epochs, passes=args.passes, seed=args.seed,
+                             labels_path=args.labels)
+    if args.model:
+        result.model().save(args.model)
+    state = "converged" if result.converged else f"not converged (delta {result.delta:.2e})"
+    print(f"{result.rows} samples, {result.passes} Lloyd passes, {state}, inertia {result.inertia:.4f}")
+    for index, cluster_id in sorted(result.index_to_id.items(), key=lambda item: item[1]):
+        print(f"  Cluster {cluster_id} ({CLUSTER_LABELS.get(cluster_id, '-')}): {result.counts[index]} samples, "
+              f"avg active {result.avg_active[index]:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
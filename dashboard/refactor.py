@@ -1,75 +1,99 @@
-import re
+import argparse
+import difflib
+import glob
+import multiprocessing
+import os
+import sys
+import time
 import traceback
 
-filepath = "/home/dhanush/Desktop/hackathon-projects/drug-secure/dashboard/Dashboard.tsx"
+from codemod_cache import RefactorCache, content_hash
+from codemod_report import StepRegistry
+from editplan import EditPlan, LiteralRules
+from jsxtags import TagIndex
 
-try:
-    with open(filepath, "r") as f:
-        content = f.read()
+filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Dashboard.tsx")
+
+# Bump whenever a rewrite below changes, so cached results are discarded.
+TRANSFORM_VERSION = "1"
+
+SAVE_BUTTON = '<button onClick={handleSave} className="px-3 py-1.5 bg-indigo-600 hover:bg-indigo-500 text-white rounded transition-colors text-xs font-medium">Save</button>'
+
+# Clean up the esf_content for the external component
+ESF_RULES = LiteralRules([
+    ('editValues?.', 'editValues.'),
+    ('editValues!', 'editValues'),
+    ("onClick={() => { setEditingSampleId(null); setValidationError(''); }}", "onClick={onCancel}"),
+    ('onClick={() => setShowQualitative(!showQualitative)}', 'onClick={() => setShowQualitativeEdit(!showQualitativeEdit)}'),
+    ('showQualitative ?', 'showQualitativeEdit ?'),
+    ('{showQualitative && (', '{showQualitativeEdit && ('),
+    ('{validationError && editingSampleId === sample.SampleID && <p', '{validationError && <p'),
+])
+
+
+def refactor(content):
+    return plan_refactor(content).render()
+
+
+def plan_refactor(content, registry=None):
+    # Every rewrite is recorded against the original buffer and the output
+    # is joined once at the end, instead of copying the file per replace.
+    # Steps whose output is already in the file are skipped and marked as
+    # applied in the registry, so re-running over a finished file is a no-op.
+    if registry is None:
+        registry = StepRegistry()
+    plan = EditPlan(content)
+    with registry.step("tag-index", len(content)):
+        tags = TagIndex(content)
+    rules = []
 
     # 1. Imports
-    content = content.replace(
+    rules.append((
         "import React, { useState, useRef } from 'react';",
-        "import React, { useState, useRef, useMemo } from 'react';"
-    )
+        "import React, { useState, useRef, useMemo } from 'react';",
+        "imports",
+    ))
 
     # 2. Extract SampleDetailPanel from lines 601-669 (exact match string representation)
     sdp_start = '<div className="flex flex-col gap-3 text-xs text-slate-400 bg-slate-900/50 p-3 rounded-lg border border-slate-700/50 shadow-inner">'
 
+    started = time.perf_counter()
+    sdp_content = ''
     idx1 = content.find(sdp_start)
-    count = 0
-    idx2 = idx1
-    while idx2 < len(content):
-        if content[idx2:idx2+4] == "<div":
-            count += 1
-        elif content[idx2:idx2+6] == "</div>":
-            count -= 1
-            if count == 0:
-                idx2 += 6
-                break
-        idx2 += 1
-
-    sdp_content = content[idx1:idx2]
+    idx2 = tags.end_of(idx1)
+    if "const SampleDetailPanel = (" in content:
+        registry.mark_applied("SampleDetailPanel")
+    elif idx2 != -1:
+        sdp_content = content[idx1:idx2]
 
-    # Replace inside Dashboard
-    content = content[:idx1] + "<SampleDetailPanel sample={sample} />" + content[idx2:]
+        # Replace inside Dashboard
+        plan.add(idx1, idx2, "<SampleDetailPanel sample={sample} />", "SampleDetailPanel")
+    registry.record("SampleDetailPanel", started, len(content))
 
 
     # 3. Extract EditSampleForm
     esf_start = '<div className="p-3 bg-slate-900/50 rounded-lg border border-indigo-500/30 space-y-2 drop-shadow-md">'
+    started = time.perf_counter()
+    my_esf = ''
     idx3 = content.find(esf_start)
-    count = 0
-    idx4 = idx3
-    while idx4 < len(content):
-        if content[idx4:idx4+4] == "<div":
-            count += 1
-        elif content[idx4:idx4+6] == "</div>":
-            count -= 1
-            if count == 0:
-                idx4 += 6
-                break
-        idx4 += 1
-
-    esf_content = content[idx3:idx4]
-    
-    # Clean up the esf_content for the external component
-    my_esf = esf_content
-    my_esf = my_esf.replace('editValues?.', 'editValues.')
-    my_esf = my_esf.replace('editValues!', 'editValues')
-    my_esf = my_esf.replace('(editValues as any)', '(editValues as any)')
-    my_esf = my_esf.replace("onClick={() => { setEditingSampleId(null); setValidationError(''); }}", "onClick={onCancel}")
-    my_esf = my_esf.replace('onClick={() => setShowQualitative(!showQualitative)}', 'onClick={() => setShowQualitativeEdit(!showQualitativeEdit)}')
-    my_esf = my_esf.replace('showQualitative ?', 'showQualitativeEdit ?')
-    my_esf = my_esf.replace('{showQualitative && (', '{showQualitativeEdit && (')
-    my_esf = my_esf.replace('{validationError && editingSampleId === sample.SampleID && <p', '{validationError && <p')
-
-    # Find the Save button which is the LAST button in EditSampleForm
-    idx_save = my_esf.rfind('<button')
-    idx_save_end = my_esf.find('</button>', idx_save) + 9
-    my_esf = my_esf[:idx_save] + '<button onClick={handleSave} className="px-3 py-1.5 bg-indigo-600 hover:bg-indigo-500 text-white rounded transition-colors text-xs font-medium">Save</button>' + my_esf[idx_save_end:]
-
-    # Replace the inline usage inside Dashboard with the simple component call
-    content = content[:idx3] + "<EditSampleForm sample={sample} onSave={(updated) => { setCustomSamples(customSamples.map(cs => cs.SampleID === sample.SampleID ? updated : cs)); setEditingSampleId(null); if (hasAnalyzed) setIsStale(true); }} onCancel={() => setEditingSampleId(null)} />" + content[idx4:]
+    idx4 = tags.end_of(idx3)
+    if "const EditSampleForm = (" in content:
+        registry.mark_applied("EditSampleForm")
+    elif idx4 != -1:
+        esf_content = content[idx3:idx4]
+        esf_plan = EditPlan(esf_content)
+
+        # Find the Save button which is the LAST button in EditSampleForm
+        idx_save = esf_content.rfind('<button')
+        idx_save_end = esf_content.find('</button>', idx_save) if idx_save != -1 else -1
+        if idx_save_end != -1:
+            esf_plan.add(idx_save, idx_save_end + 9, SAVE_BUTTON, "save-button")
+        esf_plan.add_rules(ESF_RULES)
+        my_esf = esf_plan.render()
+
+        # Replace the inline usage inside Dashboard with the simple component call
+        plan.add(idx3, idx4, "<EditSampleForm sample={sample} onSave={(updated) => { setCustomSamples(customSamples.map(cs => cs.SampleID === sample.SampleID ? updated : cs)); setEditingSampleId(null); if (hasAnalyzed) setIsStale(true); }} onCancel={() => setEditingSampleId(null)} />", "EditSampleForm")
+    registry.record("EditSampleForm", started, len(content))
 
 
     # Dashboard State Pruning & Data Derivation slice (moved here to avoid slicing injected components)
@@ -87,12 +111,15 @@ try:
     const [editValues, setEditValues] = useState<typeof newSample | null>(null);
     const [showQualitative, setShowQualitative] = useState(false);'''
 
-    content = content.replace(toremove, "    const [editingSampleId, setEditingSampleId] = useState<string | null>(null);")
+    rules.append((toremove, "    const [editingSampleId, setEditingSampleId] = useState<string | null>(null);", "state-pruning"))
 
+    started = time.perf_counter()
     idx_parse = content.find("const parsePastedData = (raw: string) => {")
     idx_handle = content.find("const handleAddSample = () => {")
-    idx_handle_end = content.find("setShowAddForm(false);\n    };\n", idx_handle) + len("setShowAddForm(false);\n    };\n")
-    content = content[:idx_parse] + content[idx_handle_end:]
+    idx_handle_end = content.find("setShowAddForm(false);\n    };\n", idx_handle) if idx_handle != -1 else -1
+    if idx_parse != -1 and idx_handle_end != -1:
+        plan.add(idx_parse, idx_handle_end + len("setShowAddForm(false);\n    };\n"), "", "parsePastedData")
+    registry.record("parsePastedData", started, len(content))
 
     # Now inject the newly extracted components safely since the slice is over
     components_str = """
@@ -347,15 +374,19 @@ const EditSampleForm = ({ sample, onSave, onCancel }: { sample: Sample, onSave:
     components_str = components_str.replace('__SDP_CONTENT__', sdp_content)
     components_str = components_str.replace('__ESF_CONTENT__', my_esf)
 
-    content = content.replace("export default function Dashboard() {", components_str + "\nexport default function Dashboard() {")
+    if "const CustomDot = (props: any) => {" in content:
+        registry.mark_applied("components")
+    else:
+        rules.append(("export default function Dashboard() {", components_str + "\nexport default function Dashboard() {", "components"))
 
     # Add memoized data dependencies
-    content = content.replace(
+    rules.append((
         "const allData = [...mockData, ...customSamples];",
-        "const allData = useMemo(() => [...mockData, ...customSamples], [customSamples]);"
-    )
+        "const allData = useMemo(() => [...mockData, ...customSamples], [customSamples]);",
+        "memo-all-data",
+    ))
 
-    content = content.replace(
+    rules.append((
     '''    const scatterCluster1 = analyzedData.filter(d => d.Cluster === 1);
     const scatterCluster2 = analyzedData.filter(d => d.Cluster === 2);
     const scatterCluster3 = analyzedData.filter(d => d.Cluster === 3);''',
@@ -363,22 +394,25 @@ const EditSampleForm = ({ sample, onSave, onCancel }: { sample: Sample, onSave:
         scatterCluster1: analyzedData.filter(d => d.Cluster === 1),
         scatterCluster2: analyzedData.filter(d => d.Cluster === 2),
         scatterCluster3: analyzedData.filter(d => d.Cluster === 3),
-    }), [analyzedData]);'''
-    )
+    }), [analyzedData]);''',
+    "memo-scatter-clusters",
+    ))
 
-    content = content.replace(
+    rules.append((
         "const dynamicBrandConsistencyData = computeBrandConsistency(analyzedData);",
-        "const dynamicBrandConsistencyData = useMemo(() => computeBrandConsistency(analyzedData), [analyzedData]);"
-    )
+        "const dynamicBrandConsistencyData = useMemo(() => computeBrandConsistency(analyzedData), [analyzedData]);",
+        "memo-brand-consistency",
+    ))
 
-    content = content.replace(
+    rules.append((
     '''    const flaggedSamples = analyzedData.filter(s => s.Cluster === 2 || s.Cluster === 3).length;
     const cleanSamples = analyzedData.filter(s => s.Cluster === 1).length;''',
     '''    const { flaggedSamples, cleanSamples } = useMemo(() => ({
         flaggedSamples: analyzedData.filter(s => s.Cluster === 2 || s.Cluster === 3).length,
         cleanSamples: analyzedData.filter(s => s.Cluster === 1).length,
-    }), [analyzedData]);'''
-    )
+    }), [analyzedData]);''',
+    "memo-flagged-counts",
+    ))
 
     clusterstats_old = '''    const clusterStats = {
         1: { active: 0, heavy: 0, waterExtract: 0, alcoholExtract: 0 },
@@ -431,24 +465,25 @@ const EditSampleForm = ({ sample, onSave, onCancel }: { sample: Sample, onSave:
         return [Math.max(0, Math.floor(min - 5)), Math.ceil(max + 2)];
     }, [analyzedData]);'''
 
-    content = content.replace(clusterstats_old, clusterstats_new)
+    rules.append((clusterstats_old, clusterstats_new, "memo-cluster-stats"))
 
-    content = content.replace('domain={[60, 100]}', 'domain={scatterXDomain}')
-    content = content.replace('<Scatter name="High Purity" data={scatterCluster1} fill={CLUSTER_COLORS[1]} />', '<Scatter name="High Purity" data={scatterCluster1} fill={CLUSTER_COLORS[1]} shape={<CustomDot />} />')
-    content = content.replace('<Scatter name="Moderate Risk" data={scatterCluster2} fill={CLUSTER_COLORS[2]} />', '<Scatter name="Moderate Risk" data={scatterCluster2} fill={CLUSTER_COLORS[2]} shape={<CustomDot />} />')
-    content = content.replace('<Scatter name="Contaminated" data={scatterCluster3} fill={CLUSTER_COLORS[3]} />', '<Scatter name="Contaminated" data={scatterCluster3} fill={CLUSTER_COLORS[3]} shape={<CustomDot />} />')
-    content = content.replace('<Legend wrapperStyle={{ paddingTop: \'10px\', fontSize: \'12px\', color: \'#cbd5e1\' }} />', '<Legend wrapperStyle={{ paddingTop: \'10px\', fontSize: \'12px\', color: \'#cbd5e1\' }} />\\n                                                <text x="50%" y="300" textAnchor="middle" className="text-[10px]" fill="#64748b">▲ Triangle = Custom sample</text>')
+    rules.append(('domain={[60, 100]}', 'domain={scatterXDomain}', "scatter-domain"))
+    rules.append(('<Scatter name="High Purity" data={scatterCluster1} fill={CLUSTER_COLORS[1]} />', '<Scatter name="High Purity" data={scatterCluster1} fill={CLUSTER_COLORS[1]} shape={<CustomDot />} />', "custom-dot-high-purity"))
+    rules.append(('<Scatter name="Moderate Risk" data={scatterCluster2} fill={CLUSTER_COLORS[2]} />', '<Scatter name="Moderate Risk" data={scatterCluster2} fill={CLUSTER_COLORS[2]} shape={<CustomDot />} />', "custom-dot-moderate-risk"))
+    rules.append(('<Scatter name="Contaminated" data={scatterCluster3} fill={CLUSTER_COLORS[3]} />', '<Scatter name="Contaminated" data={scatterCluster3} fill={CLUSTER_COLORS[3]} shape={<CustomDot />} />', "custom-dot-contaminated"))
+    rules.append(('<Legend wrapperStyle={{ paddingTop: \'10px\', fontSize: \'12px\', color: \'#cbd5e1\' }} />', '<Legend wrapperStyle={{ paddingTop: \'10px\', fontSize: \'12px\', color: \'#cbd5e1\' }} />\\n                                                <text x="50%" y="300" textAnchor="middle" className="text-[10px]" fill="#64748b">▲ Triangle = Custom sample</text>', "legend-triangle"))
 
-    content = content.replace('className="flex items-center justify-between px-6 py-4 bg-slate-800 border-b border-slate-700 shadow-md"', 'className={`flex items-center justify-between px-6 py-4 bg-slate-800 shadow-md ${isAnalyzing ? "border-b-2 border-b-indigo-500 analyzing-border" : hasAnalyzed && !isStale ? "border-b-2 border-b-green-500/50" : isStale ? "border-b-2 border-b-amber-500/50" : "border-b border-slate-700"}`}')
+    rules.append(('className="flex items-center justify-between px-6 py-4 bg-slate-800 border-b border-slate-700 shadow-md"', 'className={`flex items-center justify-between px-6 py-4 bg-slate-800 shadow-md ${isAnalyzing ? "border-b-2 border-b-indigo-500 analyzing-border" : hasAnalyzed && !isStale ? "border-b-2 border-b-green-500/50" : isStale ? "border-b-2 border-b-amber-500/50" : "border-b border-slate-700"}`}', "header-border"))
 
     addform_raw = '''{showAddForm && (
                             <div className="mb-3 p-3 bg-slate-900/50 rounded-lg border border-slate-700/50 space-y-2 text-sm drop-shadow-md overflow-hidden">'''
 
+    started = time.perf_counter()
     idx_addform = content.find(addform_raw)
     if idx_addform != -1:
         idx_endadd = content.find('Add to Dataset\n                                </button>\n                            </div>\n                        )}', idx_addform)
         if idx_endadd != -1:
-            text_to_replace = content[idx_addform:idx_endadd + len('Add to Dataset\n                                </button>\n                            </div>')]
+            idx_endadd += len('Add to Dataset\n                                </button>\n                            </div>')
             
             replacement = '''{showAddForm && (
                                 <AddSampleForm 
@@ -463,12 +498,15 @@ const EditSampleForm = ({ sample, onSave, onCancel }: { sample: Sample, onSave:
                                         return id;
                                     }}
                                 />'''
-            content = content.replace(text_to_replace, replacement)
+            plan.add(idx_addform, idx_endadd, replacement, "AddSampleForm")
+    registry.record("AddSampleForm", started, len(content))
 
-    content = content.replace('shadow-md h-64 flex flex-col', 'shadow-md flex flex-col')
-    content = content.replace('<div className="bg-slate-800 p-5 rounded-xl border border-slate-700 shadow-md flex flex-col animate-fade-slide-up delay-200">', '<div className="bg-slate-800 p-5 rounded-xl border border-slate-700 shadow-md flex flex-col animate-fade-slide-up delay-200" style={{ height: `${Math.max(200, dynamicBrandConsistencyData.length * 56 + 60)}px` }}>')
+    rules.append(('shadow-md h-64 flex flex-col', 'shadow-md flex flex-col', "brand-card-height"))
+    rules.append(('<div className="bg-slate-800 p-5 rounded-xl border border-slate-700 shadow-md flex flex-col animate-fade-slide-up delay-200">', '<div className="bg-slate-800 p-5 rounded-xl border border-slate-700 shadow-md flex flex-col animate-fade-slide-up delay-200" style={{ height: `${Math.max(200, dynamicBrandConsistencyData.length * 56 + 60)}px` }}>', "brand-card-height"))
+    # Same card, still carrying h-64: both rewrites apply in one span
+    rules.append(('<div className="bg-slate-800 p-5 rounded-xl border border-slate-700 shadow-md h-64 flex flex-col animate-fade-slide-up delay-200">', '<div className="bg-slate-800 p-5 rounded-xl border border-slate-700 shadow-md flex flex-col animate-fade-slide-up delay-200" style={{ height: `${Math.max(200, dynamicBrandConsistencyData.length * 56 + 60)}px` }}>', "brand-card-height"))
 
-    content = content.replace('{CLUSTER_LABELS[cluster]}', '{CLUSTER_LABELS[cluster]} <span className="text-slate-500 font-normal text-xs ml-1">· {clusterCounts[cluster]}</span>')
+    rules.append(('{CLUSTER_LABELS[cluster]}', '{CLUSTER_LABELS[cluster]} <span className="text-slate-500 font-normal text-xs ml-1">· {clusterCounts[cluster]}</span>', "cluster-count-label"))
 
     old_empty = '''                                    <Beaker className="w-12 h-12 mb-4 opacity-50" />
                                     <p className="text-lg font-medium">Awaiting Analysis</p>
@@ -506,7 +544,7 @@ const EditSampleForm = ({ sample, onSave, onCancel }: { sample: Sample, onSave:
                                     <Activity className="w-4 h-4" />
                                     Run Analysis
                                   </button>'''
-    content = content.replace(old_empty, new_empty)
+    rules.append((old_empty, new_empty, "empty-state"))
 
     old_load = '''                                    <Loader2 className="w-12 h-12 animate-spin text-indigo-500 mb-4" />
                                     <p className="text-lg font-medium text-slate-300">Running advanced clustering analysis...</p>
@@ -522,10 +560,10 @@ const EditSampleForm = ({ sample, onSave, onCancel }: { sample: Sample, onSave:
                                     <div className="w-1.5 h-1.5 rounded-full bg-indigo-500 animate-pulse" />
                                     <span>Applying WHO / FSSAI benchmarks</span>
                                   </div>'''
-    content = content.replace(old_load, new_load)
-    content = content.replace('<div className="flex-1 flex flex-col items-center justify-center text-slate-500 border-2 border-dashed border-slate-700 rounded-xl bg-slate-800/30">', '<div className="flex-1 flex flex-col items-center justify-center rounded-xl bg-slate-800/30 border-2 border-dashed border-slate-700 p-12">')
+    rules.append((old_load, new_load, "loading-state"))
+    rules.append(('<div className="flex-1 flex flex-col items-center justify-center text-slate-500 border-2 border-dashed border-slate-700 rounded-xl bg-slate-800/30">', '<div className="flex-1 flex flex-col items-center justify-center rounded-xl bg-slate-800/30 border-2 border-dashed border-slate-700 p-12">', "empty-state-container"))
 
-    content = content.replace('<div className="p-3 border-t border-slate-700 bg-slate-800/80 mt-auto">', '<div className="p-3 border-t border-slate-700 bg-slate-800/80 flex flex-col max-h-[45%] overflow-y-auto mt-auto">')
+    rules.append(('<div className="p-3 border-t border-slate-700 bg-slate-800/80 mt-auto">', '<div className="p-3 border-t border-slate-700 bg-slate-800/80 flex flex-col max-h-[45%] overflow-y-auto mt-auto">', "sample-list-footer"))
 
     amb_badge = '''{hasAnalyzed && ('''
     amb_badge_new = '''{!hasAnalyzed && customSamples.length > 0 && (
@@ -535,7 +573,7 @@ const EditSampleForm = ({ sample, onSave, onCancel }: { sample: Sample, onSave:
                         </div>
                     )}
                     {hasAnalyzed && ('''
-    content = content.replace(amb_badge, amb_badge_new)
+    rules.append((amb_badge, amb_badge_new, "pending-badge"))
 
     pulse_css = '''                .delay-300 { animation-delay: 300ms; }
             `}</style>'''
@@ -548,22 +586,198 @@ const EditSampleForm = ({ sample, onSave, onCancel }: { sample: Sample, onSave:
                 }
                 .delay-300 { animation-delay: 300ms; }
             `}</style>'''
-    content = content.replace(pulse_css, pulse_new)
+    rules.append((pulse_css, pulse_new, "pulse-border-css"))
 
+    started = time.perf_counter()
     idx_card = content.find('<div className="bg-slate-800 p-5 rounded-xl border border-slate-700 border-t-4 border-t-green-500 shadow-md">')
     if idx_card != -1:
         idx_end_card = content.find('</div>\n                                </div>\n                            </div>\n                        </>\n                    )}\n\n                </div>\n\n            </main>')
         if idx_end_card != -1:
-            text_to_replace = content[idx_card:idx_end_card + len('</div>\n                                </div>\n                            </div>')]
+            idx_end_card += len('</div>\n                                </div>\n                            </div>')
             replacement = '''<ClusterSummaryCard clusterId={1} label="High Purity" color="green" topColor="border-t-green-500" stats={clusterStats[1]} isCompliantStatus={isCompliant(clusterStats[1])} />
                                 <ClusterSummaryCard clusterId={2} label="Moderate Risk" color="amber" topColor="border-t-amber-500" stats={clusterStats[2]} isCompliantStatus={isCompliant(clusterStats[2])} />
                                 <ClusterSummaryCard clusterId={3} label="Contaminated" color="red" topColor="border-t-red-500" stats={clusterStats[3]} isCompliantStatus={isCompliant(clusterStats[3])} />
                             </div>'''
-            content = content.replace(text_to_replace, replacement)
-
-    with open(filepath, "w") as f:
-        f.write(content)
-
-    print("Refactoring complete.")
-except Exception as e:
-    traceback.print_exc()
+            plan.add(idx_card, idx_end_card, replacement, "ClusterSummaryCard")
+    registry.record("ClusterSummaryCard", started, len(content))
+
+    # A rewrite whose replacement contains its own pattern (the amb_badge,
+    # cluster count and legend rewrites) would apply again on every run.
+    pending = []
+    for old, new, name in rules:
+        registry.register(name)
+        if old in new and new in content:
+            registry.mark_applied(name)
+        else:
+            pending.append((old, new, name))
+
+    with registry.step("literal-scan", len(content)):
+        plan.add_rules(LiteralRules(pending))
+        plan.spans()
+    registry.count_edits(plan.edits)
+
+    # A step that matched nothing but whose output is already in the file was
+    # applied by an earlier run; it has not silently stopped matching.
+    markers = {name: new for old, new, name in rules}
+    markers.update({
+        "parsePastedData": "const AddSampleForm = (",
+        "AddSampleForm": "<AddSampleForm",
+        "ClusterSummaryCard": "<ClusterSummaryCard clusterId={1}",
+    })
+    for name in registry.zero_match():
+        if name in markers and markers[name] in content:
+            registry.mark_applied(name)
+    return plan
+
+
+def iter_paths(targets, pattern="*.tsx"):
+    seen = set()
+    for target in targets:
+        if os.path.isdir(target):
+            matches = glob.iglob(os.path.join(target, "**", pattern), recursive=True)
+        else:
+            matches = glob.iglob(target, recursive=True)
+        for path in matches:
+            if os.path.isfile(path) and path not in seen:
+                seen.add(path)
+                yield path
+
+
+# Content hashes of files already finished under TRANSFORM_VERSION; set
+# once per worker process by _init_worker.
+_done = frozenset()
+
+
+def _init_worker(done):
+    global _done
+    _done = done
+
+
+def refactor_file(path, dry_run=False, strict=False):
+    # Runs in a worker process; only a small summary (plus the diff in
+    # dry-run mode) travels back to the parent.
+    try:
+        with open(path, "r") as f:
+            content = f.read()
+        digest = content_hash(content)
+        if digest in _done:
+            return {"path": path, "status": "cached", "sha256": digest}
+        registry = StepRegistry()
+        plan = plan_refactor(content, registry)
+        new_content = plan.render()
+        zero_match = registry.zero_match()
+        diff = ""
+        if strict and zero_match:
+            # Leave the file untouched rather than writing a partial rewrite.
+            status = "failed"
+        elif new_content != content:
+            status = "changed"
+            if dry_run:
+                diff = "".join(difflib.unified_diff(
+                    content.splitlines(keepends=True), new_content.splitlines(keepends=True),
+                    fromfile=f"a/{path}", tofile=f"b/{path}"))
+            else:
+                with open(path, "w") as f:
+                    f.write(new_content)
+        else:
+            status = "unchanged"
+        return {
+            "path": path,
+            "status": status,
+            "edits": len(plan.edits),
+            "conflicts": len(plan.conflicts),
+            "already_applied": sum(rec["already_applied"] for rec in registry.steps.values()),
+            "zero_match": zero_match,
+            "steps": registry.to_dict(),
+            "bytes_in": len(content),
+            "bytes_out": len(new_content),
+            "diff": diff,
+            "sha256": content_hash(new_content),
+        }
+    except Exception:
+        return {"path": path, "status": "error", "error": traceback.format_exc()}
+
+
+def _refactor_file_task(args):
+    return refactor_file(*args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply the Dashboard.tsx refactoring to one or more files.")
+    parser.add_argument("targets", nargs="*", default=[filepath], help="files, globs or directories (default: dashboard/Dashboard.tsx)")
+    parser.add_argument("--pattern", default="*.tsx", help="file pattern used when a target is a directory (default: *.tsx)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    parser.add_argument("--dry-run", action="store_true", help="print unified diffs instead of writing files")
+    parser.add_argument("--cache", default=".refactor-cache.json", help="cache of finished files (default: .refactor-cache.json)")
+    parser.add_argument("--no-cache", action="store_true", help="process every file, ignoring and not updating the cache")
+    parser.add_argument("--strict", action="store_true", help="fail (and leave unwritten) any file where a step matched nothing")
+    parser.add_argument("--stats", action="store_true", help="print a per-step timing and match table when done")
+    parser.add_argument("--report", metavar="PATH", help="write per-step counters and per-file results as JSON")
+    args = parser.parse_args(argv)
+
+    cache = None if args.no_cache else RefactorCache(args.cache, TRANSFORM_VERSION)
+    counts = {"changed": 0, "unchanged": 0, "failed": 0, "cached": 0, "error": 0}
+    registry = StepRegistry()
+    files = {}
+
+    def report(result):
+        counts[result["status"]] += 1
+        if result["status"] == "error":
+            files[result["path"]] = {"status": "error"}
+            print(f"{result['path']}: error", file=sys.stderr)
+            print(result["error"], file=sys.stderr)
+            return
+        if cache is not None and result["status"] != "failed" and (result["status"] != "changed" or not args.dry_run):
+            cache.record(result["path"], result["sha256"])
+        if result["status"] == "cached":
+            return
+        registry.merge(result["steps"])
+        files[result["path"]] = {"status": result["status"], "zero_match": result["zero_match"]}
+        if result["diff"]:
+            sys.stdout.write(result["diff"])
+        summary = (f"{result['path']}: {result['status']}, {result['edits']} edits, "
+                   f"{result['conflicts']} conflicts, {result['already_applied']} already applied, "
+                   f"{result['bytes_in']} -> {result['bytes_out']} bytes")
+        if result["zero_match"]:
+            summary += f"; no match: {', '.join(result['zero_match'])}"
+        print(summary, file=sys.stderr if args.dry_run else sys.stdout)
+
+    # Cache hits are split off before any worker starts: the pool's task
+    # thread must not touch ``cache`` or ``counts`` while report() updates
+    # them on this thread.
+    tasks = []
+    for path in iter_paths(args.targets, args.pattern):
+        if cache is not None and cache.is_fresh(path):
+            counts["cached"] += 1
+        else:
+            tasks.append((path, args.dry_run, args.strict))
+    done = frozenset(cache.done) if cache is not None else frozenset()
+    try:
+        if args.jobs <= 1:
+            _init_worker(done)
+            for task in tasks:
+                report(_refactor_file_task(task))
+        else:
+            # imap_unordered streams summaries back as workers finish, so the
+            # parent never holds more than one file's result at a time.
+            with multiprocessing.Pool(args.jobs, initializer=_init_worker, initargs=(done,)) as pool:
+                for result in pool.imap_unordered(_refactor_file_task, tasks, chunksize=4):
+                    report(result)
+    finally:
+        if cache is not None:
+            cache.save()
+
+    if args.stats:
+        print(registry.format_table(), file=sys.stderr)
+    if args.report:
+        registry.write_json(args.report, counts=counts, files=files)
+
+    total = sum(counts.values())
+    print(f"Refactoring complete: {total} files, {counts['changed']} changed, "
+          f"{counts['unchanged']} unchanged, {counts['failed']} failed, {counts['cached']} cached, "
+          f"{counts['error']} errors.", file=sys.stderr)
+    return 1 if counts["error"] or counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,370 @@
+import argparse
+import datetime
+import html
+import math
+import os
+import sys
+
+import numpy as np
+
+from aggregates import Aggregates
+from analysis import CLUSTER_LABELS, FEATURE_INDEX, INDUSTRY_BENCHMARKS, AnalysisError, run_analysis
+from compliance import BENCHMARK_SETS, CHECKS, ComplianceTable, is_compliant, load_benchmarks, violations
+from scatter_lod import x_domain, y_domain
+
+OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output.html")
+PAGE_ROWS = 500                # table rows per page
+CHUNK_ROWS = 65536             # rows read per pass over the store
+SCATTER_BINS = 64              # density grid per axis of the scatter chart
+BUFFER_BYTES = 1 << 20
+
+# CLUSTER_COLORS and the Tailwind tints of ClusterSummaryCard.
+CLUSTER_COLORS = {1: "#22c55e", 2: "#f59e0b", 3: "#ef4444"}
+CLUSTER_TEXT = {1: "#4ade80", 2: "#fbbf24", 3: "#f87171"}
+REFERENCE = "#6366f1"
+
+TABLE_COLUMNS = (
+    "MoisturePct", "TotalAsh", "AcidInsolAsh", "HeavyMetalPpm", "ActiveCompoundPct",
+    "WaterExtractPct", "AlcoholExtractPct", "pH",
+)
+
+STYLE = """
+body{margin:0;background:#0f172a;color:#f1f5f9;font-family:system-ui,-apple-system,'Segoe UI',sans-serif}
+main{max-width:1200px;margin:0 auto;padding:24px}
+h1{font-size:24px;margin:0 0 4px}h2{font-size:16px;color:#e2e8f0;margin:0 0 16px}
+.muted{color:#94a3b8;font-size:13px}
+.grid{display:grid;gap:16px;margin:24px 0}.cols-3{grid-template-columns:repeat(3,1fr)}.cols-2{grid-template-columns:repeat(2,1fr)}
+.cols-4{grid-template-columns:repeat(4,1fr)}
+.panel{background:#1e293b;border:1px solid #334155;border-radius:12px;padding:20px;box-shadow:0 4px 6px rgba(0,0,0,.2)}
+.stat{font-size:28px;font-weight:700}
+.card{border-top-width:4px}
+.card h3{color:#94a3b8;font-size:12px;font-weight:600;text-transform:uppercase;letter-spacing:.05em;margin:0 0 4px}
+.card .label{display:flex;align-items:center;gap:8px;font-size:18px;font-weight:700;margin-bottom:12px}
+.dot{width:12px;height:12px;border-radius:50%;display:inline-block}
+.card p{display:flex;justify-content:space-between;margin:4px 0;font-size:14px;color:#cbd5e1}
+.card .mono{font-family:ui-monospace,monospace}
+.card .who{margin-top:8px;padding-top:8px;border-top:1px solid #334155}
+.yes{color:#4ade80;font-weight:500}.no{color:#f87171;font-weight:500}
+.bar{display:grid;grid-template-columns:160px 1fr 56px;align-items:center;gap:12px;margin:6px 0;font-size:13px}
+.bar .track{background:#0f172a;border-radius:4px;height:20px}.bar .fill{height:20px;border-radius:0 4px 4px 0}
+.bar .name{color:#94a3b8;text-align:right;overflow:hidden;text-overflow:ellipsis;white-space:nowrap}
+svg text{fill:#94a3b8;font-size:12px}
+table{width:100%;border-collapse:collapse;font-size:13px}
+th{color:#94a3b8;text-align:left;font-weight:600;padding:8px;border-bottom:1px solid #334155;position:sticky;top:0;background:#1e293b}
+td{padding:6px 8px;border-bottom:1px solid #1e293b99}td.num{font-family:ui-monospace,monospace;text-align:right}
+td.bad{color:#f87171}tr:nth-child(even){background:#0f172a66}
+.page{display:none}.page:target{display:block}
+nav.pager{display:flex;gap:12px;align-items:center;margin:12px 0;font-size:13px}
+nav.pager a{color:#a5b4fc;text-decoration:none}
+.warning{background:#451a03;border:1px solid #b45309;color:#fde68a;border-radius:8px;padding:12px;margin-top:16px}
+"""
+
+SCRIPT = """
+if(!location.hash&&document.getElementById('page-1'))location.replace('#page-1');
+function jumpTo(form){var n=parseInt(form.page.value,10);if(n>0)location.hash='#page-'+n;return false;}
+"""
+
+
+def esc(value):
+    return html.escape(str(value), quote=True)
+
+
+def score_color(score):
+    # Bar colours of the Brand Consistency chart.
+    return "#22c55e" if score >= 75 else "#f59e0b" if score >= 40 else "#ef4444"
+
+
+class ReportData:
+    """Everything the report shows above the sample table, computed before writing.
+
+    The aggregates come from one chunked pass over the feature matrix, so
+    the extra memory is fixed by the chunk and grid sizes. The pass
+    collects the per-check violation counts, the violating-row count and
+    a per-cluster density grid for the scatter chart. Cluster stats and
+    brand scores come from Aggregates.
+    """
+
+    def __init__(self, X, clusters, brand_codes, brand_names, benchmarks="default", chunk_rows=CHUNK_ROWS):
+        self.benchmarks = BENCHMARK_SETS[benchmarks] if isinstance(benchmarks, str) else benchmarks
+        self.rows = len(X)
+        self.aggregates = Aggregates.build(brand_codes, X, clusters, names=brand_names)
+        active = X[:, FEATURE_INDEX["ActiveCompoundPct"]]
+        heavy = X[:, FEATURE_INDEX["HeavyMetalPpm"]]
+        self.x_domain = x_domain(active)
+        self.y_domain = y_domain(heavy)
+
+        self.violation_counts = dict.fromkeys(CHECKS, 0)
+        self.violating = 0
+        self.density = np.zeros((4, SCATTER_BINS, SCATTER_BINS), dtype=np.int64)
+        self.sums = np.zeros((4, SCATTER_BINS, SCATTER_BINS, 2))
+        (x0, x1), (y0, y1) = self.x_domain, self.y_domain
+        for start in range(0, len(X), chunk_rows):
+            block = X[start:start + chunk_rows]
+            mask = ComplianceTable(block).check(self.benchmarks)
+            self.violating += int(np.count_nonzero(mask))
+            for bit, name in enumerate(CHECKS):
+                self.violation_counts[name] += int(np.count_nonzero(mask & (1 << bit)))
+            x = np.asarray(active[start:start + chunk_rows], dtype=np.float64)
+            y = np.asarray(heavy[start:start + chunk_rows], dtype=np.float64)
+            ix = np.clip(((x - x0) / (x1 - x0) * SCATTER_BINS).astype(np.int64), 0, SCATTER_BINS - 1)
+            iy = np.clip(((y - y0) / (y1 - y0) * SCATTER_BINS).astype(np.int64), 0, SCATTER_BINS - 1)
+            c = np.asarray(clusters[start:start + chunk_rows], dtype=np.int64)
+            np.add.at(self.density, (c, ix, iy), 1)
+            np.add.at(self.sums, (c, ix, iy, 0), x)
+            np.add.at(self.sums, (c, ix, iy, 1), y)
+
+
+def header(data, title, generated, low_separation):
+    agg = data.aggregates
+    yield ("<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n<meta charset=\"utf-8\">\n"
+           "<meta name=\"viewport\" content=\"width=device-width, initial-scale=1\">\n"
+           f"<title>{esc(title)}</title>\n<style>{STYLE}</style>\n"
+           "<noscript><style>.page{display:block}</style></noscript>\n</head>\n<body>\n<main>\n")
+    yield (f"<h1>{esc(title)}</h1>\n<p class=\"muted\">Generated {esc(generated)} &middot; "
+           f"benchmarks: {esc(data.benchmarks.label)}</p>\n")
+    if low_separation:
+        yield "<div class=\"warning\">Warning: cluster separation is low, mapping may be unreliable</div>\n"
+    tiles = (("Total Samples", data.rows, "#f1f5f9"), ("Flagged Samples", agg.flagged_samples(), CLUSTER_TEXT[3]),
+             ("Clean Samples", agg.clean_samples(), CLUSTER_TEXT[1]),
+             ("Non-compliant Samples", data.violating, CLUSTER_TEXT[2]))
+    yield "<section class=\"grid cols-4\">\n"
+    for label, value, color in tiles:
+        yield (f"<div class=\"panel\"><div class=\"muted\">{label}</div>"
+               f"<div class=\"stat\" style=\"color:{color}\">{value:,}</div></div>\n")
+    yield "</section>\n"
+
+
+def summary_cards(data):
+    """ClusterSummaryCard for each cluster; WHO Compliant is isCompliant() on its averages."""
+    stats = data.aggregates.cluster_stats()
+    yield "<section class=\"grid cols-3\">\n"
+    for cluster_id, label in CLUSTER_LABELS.items():
+        s = stats[cluster_id]
+        color, text = CLUSTER_COLORS[cluster_id], CLUSTER_TEXT[cluster_id]
+        compliant = ("<span class=\"yes\">&#10003; Yes</span>" if is_compliant(s, INDUSTRY_BENCHMARKS)
+                     else "<span class=\"no\">&#10007; No</span>")
+        yield (f"<div class=\"panel card\" style=\"border-top-color:{color}\">"
+               f"<h3>Cluster {cluster_id}</h3>"
+               f"<div class=\"label\"><span class=\"dot\" style=\"background:{color}\"></span>{label}</div>"
+               f"<p><span>Avg Active:</span><span class=\"mono\" style=\"color:{text}\">{s['active']:.1f}%</span></p>"
+               f"<p><span>Avg Metal:</span><span class=\"mono\" style=\"color:{text}\">{s['heavy']:.1f} ppm</span></p>"
+               f"<p><span>Avg Water Ext:</span><span class=\"mono\" style=\"color:{text}\">"
+               f"{s['waterExtract']:.1f}%</span></p>"
+               f"<p><span>Avg Alcohol Ext:</span><span class=\"mono\" style=\"color:{text}\">"
+               f"{s['alcoholExtract']:.1f}%</span></p>"
+               f"<p class=\"who\"><span>WHO Compliant:</span>{compliant}</p></div>\n")
+    yield "</section>\n"
+
+
+def bars(title, rows, suffix="", scale=None):
+    """A horizontal bar chart of (name, value, color) rows, scaled to ``scale`` (default: the largest value)."""
+    scale = scale or max((value for _, value, _ in rows), default=0) or 1
+    yield f"<div class=\"panel\"><h2>{esc(title)}</h2>\n"
+    for name, value, color in rows:
+        width = 100.0 * value / scale
+        yield (f"<div class=\"bar\"><span class=\"name\" title=\"{esc(name)}\">{esc(name)}</span>"
+               f"<div class=\"track\"><div class=\"fill\" style=\"width:{width:.2f}%;background:{color}\"></div></div>"
+               f"<span>{value:,}{suffix}</span></div>\n")
+    yield "</div>\n"
+
+
+def scatter(data, width=560, height=360, pad=48):
+    """Active % vs Heavy Metal ppm as density marks: one circle per occupied grid cell, area by count."""
+    (x0, x1), (y0, y1) = data.x_domain, data.y_domain
+    plot_w, plot_h = width - 2 * pad, height - 2 * pad
+
+    def px(x):
+        return pad + (x - x0) / (x1 - x0) * plot_w
+
+    def py(y):
+        return height - pad - (y - y0) / (y1 - y0) * plot_h
+
+    largest = max(int(data.density.max()), 1)
+    yield (f"<div class=\"panel\"><h2>Active Compound vs Heavy Metals</h2>\n"
+           f"<svg viewBox=\"0 0 {width} {height}\" width=\"100%\" role=\"img\">\n")
+    for i in range(5):
+        gx = x0 + (x1 - x0) * i / 4
+        gy = y0 + (y1 - y0) * i / 4
+        yield (f"<line x1=\"{pad}\" x2=\"{width - pad}\" y1=\"{py(gy):.1f}\" y2=\"{py(gy):.1f}\" stroke=\"#334155\" "
+               f"stroke-dasharray=\"3 3\"/><text x=\"{pad - 6}\" y=\"{py(gy) + 4:.1f}\" text-anchor=\"end\">{gy:g}</text>"
+               f"<text x=\"{px(gx):.1f}\" y=\"{height - pad + 16}\" text-anchor=\"middle\">{gx:g}</text>\n")
+    yield (f"<text x=\"{pad + plot_w / 2}\" y=\"{height - 8}\" text-anchor=\"middle\">Active Compound (%)</text>"
+           f"<text transform=\"translate(14 {pad + plot_h / 2}) rotate(-90)\" text-anchor=\"middle\">"
+           f"Heavy Metals (ppm)</text>\n")
+    for cluster_id in CLUSTER_LABELS:
+        counts = data.density[cluster_id]
+        ix, iy = np.nonzero(counts)
+        n = counts[ix, iy]
+        mx = data.sums[cluster_id, ix, iy, 0] / n
+        my = data.sums[cluster_id, ix, iy, 1] / n
+        radius = 2.5 + 9.0 * np.sqrt(n / largest)
+        yield f"<g fill=\"{CLUSTER_COLORS[cluster_id]}\" fill-opacity=\"0.7\">"
+        yield "".join(f"<circle cx=\"{px(x):.1f}\" cy=\"{py(y):.1f}\" r=\"{r:.1f}\"><title>{c:,}</title></circle>"
+                      for x, y, r, c in zip(mx, my, radius, n))
+        yield "</g>\n"
+    ref_x = INDUSTRY_BENCHMARKS["ActiveCompoundPct"]
+    ref_y = INDUSTRY_BENCHMARKS["HeavyMetalPpm"]
+    if x0 <= ref_x <= x1:
+        yield (f"<line x1=\"{px(ref_x):.1f}\" x2=\"{px(ref_x):.1f}\" y1=\"{pad}\" y2=\"{height - pad}\" "
+               f"stroke=\"{REFERENCE}\" stroke-dasharray=\"4 4\"/><text x=\"{px(ref_x) + 4:.1f}\" y=\"{pad + 12}\">"
+               f"WHO Min</text>\n")
+    if y0 <= ref_y <= y1:
+        yield (f"<line x1=\"{pad}\" x2=\"{width - pad}\" y1=\"{py(ref_y):.1f}\" y2=\"{py(ref_y):.1f}\" "
+               f"stroke=\"{REFERENCE}\" stroke-dasharray=\"4 4\"/><text x=\"{width - pad - 4}\" "
+               f"y=\"{py(ref_y) - 4:.1f}\" text-anchor=\"end\">WHO Max</text>\n")
+    yield "</svg>\n<p class=\"muted\">"
+    yield " &middot; ".join(f"<span class=\"dot\" style=\"background:{CLUSTER_COLORS[c]}\"></span> {label}"
+                            for c, label in CLUSTER_LABELS.items())
+    yield "</p></div>\n"
+
+
+def charts(data):
+    agg = data.aggregates
+    yield "<section class=\"grid cols-2\">\n"
+    yield from scatter(data)
+    scores = [(b["name"], b["score"], score_color(b["score"])) for b in agg.brand_consistency()]
+    yield from bars("Brand Consistency Score (% High Purity)", scores, "%", scale=100)
+    counts = [(f"{c} - {label}", int(agg.cluster_counts[c]), CLUSTER_COLORS[c]) for c, label in CLUSTER_LABELS.items()]
+    yield from bars("Samples per Cluster", counts)
+    checks = [(name, count, CLUSTER_COLORS[3]) for name, count in data.violation_counts.items()]
+    yield from bars("Violations per Benchmark", checks)
+    yield "</section>\n"
+
+
+def pager(page, pages):
+    def link(n, text):
+        return f"<a href=\"#page-{n}\">{text}</a>" if 1 <= n <= pages and n != page else f"<span>{text}</span>"
+    return (f"<nav class=\"pager\">{link(1, '&laquo; First')}{link(page - 1, '&lsaquo; Prev')}"
+            f"<span>Page {page:,} of {pages:,}</span>{link(page + 1, 'Next &rsaquo;')}{link(pages, 'Last &raquo;')}"
+            f"<form onsubmit=\"return jumpTo(this)\"><input name=\"page\" size=\"6\" placeholder=\"page\"></form></nav>\n")
+
+
+def sample_table(data, sample_ids, X, clusters, brand_codes, brand_names, page_rows=PAGE_ROWS,
+                 only_violations=False, chunk_rows=CHUNK_ROWS):
+    """Per-sample compliance rows, PAGE_ROWS to a page, read chunk by chunk.
+
+    Each page is a :target section, so the table pages without a server and
+    only one page is laid out at a time.
+    """
+    total = data.violating if only_violations else data.rows
+    pages = max(1, math.ceil(total / page_rows))
+    names = np.asarray(brand_names, dtype=object)
+    # One string per possible violation mask (2**10), so rows only index it.
+    described = [", ".join(violations(m)) for m in range(1 << len(CHECKS))]
+    columns = [FEATURE_INDEX[name] for name in TABLE_COLUMNS]
+    bits = [1 << CHECKS.index(name) for name in TABLE_COLUMNS]
+    heading = "".join(f"<th>{name}</th>" for name in ("SampleID", "Brand", "Cluster") + TABLE_COLUMNS + ("Violations",))
+
+    title = "Non-compliant Samples" if only_violations else "Sample Compliance"
+    yield f"<section class=\"panel\"><h2>{title} ({total:,})</h2>\n"
+    page, on_page = 0, 0
+
+    def open_page():
+        return f"<div class=\"page\" id=\"page-{page}\">{pager(page, pages)}<table><thead><tr>{heading}</tr></thead><tbody>\n"
+
+    def close_page():
+        return f"</tbody></table>{pager(page, pages)}</div>\n"
+
+    if total == 0:
+        page = 1
+        yield open_page() + close_page()
+    for start in range(0, data.rows, chunk_rows):
+        block = np.asarray(X[start:start + chunk_rows])
+        mask = ComplianceTable(block).check(data.benchmarks)
+        rows = np.flatnonzero(mask) if only_violations else np.arange(len(block))
+        ids = np.asarray(sample_ids[start:start + chunk_rows])[rows]
+        brands = names[np.asarray(brand_codes[start:start + chunk_rows])[rows]]
+        cl = np.asarray(clusters[start:start + chunk_rows])[rows]
+        values = block[rows][:, columns]
+        masks = mask[rows]
+        lines = []
+        for sid, brand, c, vals, m in zip(ids, brands, cl, values, masks):
+            if on_page == 0:
+                page += 1
+                lines.append(open_page())
+            cells = "".join(f"<td class=\"num{' bad' if m & bit else ''}\">{v:.2f}</td>" for bit, v in zip(bits, vals))
+            lines.append(f"<tr><td>{esc(sid)}</td><td>{esc(brand)}</td>"
+                         f"<td style=\"color:{CLUSTER_TEXT[int(c)]}\">{int(c)}</td>{cells}"
+                         f"<td>{described[m]}</td></tr>\n")
+            on_page += 1
+            if on_page == page_rows:
+                lines.append(close_page())
+                on_page = 0
+                yield "".join(lines)
+                lines = []
+        if lines:
+            yield "".join(lines)
+    if on_page:
+        yield close_page()
+    yield "</section>\n"
+
+
+def footer():
+    yield f"</main>\n<script>{SCRIPT}</script>\n</body>\n</html>\n"
+
+
+def write_report(path, parts, buffer_bytes=BUFFER_BYTES):
+    """Stream ``parts`` to ``path`` through a fixed-size buffer; the file is replaced atomically.
+
+    Returns the number of bytes written.
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb", buffering=buffer_bytes) as f:
+        for part in parts:
+            f.write(part.encode("utf-8"))
+        written = f.tell()
+    os.replace(tmp, path)
+    return written
+
+
+def report(store, output=OUTPUT, benchmarks="default", page_rows=PAGE_ROWS, only_violations=False,
+           title="Drug-Secure Analysis Report"):
+    """Run the analysis on a SampleStore and write the HTML report; returns (result, bytes written)."""
+    X = store.features()
+    result = run_analysis(X)
+    brand_codes = store.codes["Brand"]
+    brand_names = store.dictionaries["Brand"].values
+    data = ReportData(X, result.clusters, brand_codes, brand_names, benchmarks)
+    generated = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+
+    def parts():
+        yield from header(data, title, generated, result.low_separation)
+        yield from summary_cards(data)
+        yield from charts(data)
+        yield from sample_table(data, store.sample_ids, X, result.clusters, brand_codes, brand_names, page_rows,
+                                only_violations)
+        yield from footer()
+
+    return result, write_report(output, parts())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse a dataset and write a self-contained HTML report.")
+    parser.add_argument("path", help="SampleStore directory or CSV/TSV export")
+    parser.add_argument("-o", "--output", default=OUTPUT, help="report file (default: dashboard/output.html)")
+    parser.add_argument("--page-rows", type=int, default=PAGE_ROWS, help=f"table rows per page (default: {PAGE_ROWS})")
+    parser.add_argument("--only-violations", action="store_true", help="list only samples that fail a benchmark")
+    parser.add_argument("--benchmarks", default="default", help="benchmark set for the sample table")
+    parser.add_argument("--benchmark-file", help="JSON file of extra benchmark sets")
+    parser.add_argument("--title", default="Drug-Secure Analysis Report")
+    args = parser.parse_args(argv)
+
+    if args.benchmark_file:
+        load_benchmarks(args.benchmark_file)
+    if os.path.isdir(args.path):
+        from samplestore import SampleStore
+        store = SampleStore.load(args.path)
+    else:
+        from ingest import ingest
+        store = ingest(args.path).store()
+    try:
+        _, written = report(store, args.output, args.benchmarks, args.page_rows, args.only_violations, args.title)
+    except AnalysisError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"wrote {args.output} ({written:,} bytes, {len(store):,} samples)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from analysis import FEATURES, AnalysisResult, KMeansResult, run_analysis
+
+# Bump when run_analysis() changes in a way that alters results, so that
+# entries written by an older pipeline are never served.
+PIPELINE_VERSION = "1"
+INIT = "k-means++"
+
+
+def fingerprint(X, k=3, seed=42, max_iter=100, tol=1e-6, features=FEATURES, init=INIT):
+    """Stable key for run_analysis(X, k, seed, max_iter, tol).
+
+    It covers the feature values in row order (as float64), the feature
+    names, every fit parameter and PIPELINE_VERSION. Row order is included
+    because results are per row.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    params = {"version": PIPELINE_VERSION, "features": list(features), "k": k, "seed": seed,
+              "max_iter": max_iter, "tol": tol, "init": init, "shape": list(X.shape)}
+    h = hashlib.blake2b(digest_size=20)
+    h.update(json.dumps(params, sort_keys=True).encode())
+    h.update(memoryview(X).cast("B"))
+    return h.hexdigest()
+
+
+def result_nbytes(result):
+    return sum(a.nbytes for a in (result.clusters, result.labels, result.centroids, result.mins, result.maxs,
+                                  result.avg_active))
+
+
+class ResultCache:
+    """AnalysisResults keyed by fingerprint(), in memory and optionally on disk.
+
+    The memory tier is an LRU capped at ``max_bytes`` of result arrays (and
+    ``max_entries`` if given). With ``directory``, every result is also
+    written there as <key>.npz. A memory miss then falls back to disk, so
+    results survive restarts. Entries are immutable because keys are
+    content hashes, so the disk tier never needs invalidating.
+
+    The disk tier is capped at ``max_disk_bytes``. A disk hit refreshes the
+    file's mtime, and each write removes the least recently used files
+    until the directory fits again. Files are written under a unique
+    temporary name and renamed into place, so processes sharing the
+    directory never see or clobber each other's partial files.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, max_entries=None, directory=None,
+                 max_disk_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "disk_writes": 0,
+                         "disk_evictions": 0}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries or (self.directory is not None and os.path.exists(self._path(key)))
+
+    def get(self, key):
+        result = self.entries.get(key)
+        if result is not None:
+            self.entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return result
+        if self.directory:
+            result = self._load(key)
+            if result is not None:
+                self.counters["disk_hits"] += 1
+                self._remember(key, result)
+                return result
+        self.counters["misses"] += 1
+        return None
+
+    def put(self, key, result):
+        if self.directory and not os.path.exists(self._path(key)):
+            self._save(key, result)
+            self.counters["disk_writes"] += 1
+            self._trim_disk()
+        self._remember(key, result)
+
+    def stats(self):
+        return dict(self.counters, entries=len(self.entries), bytes=self.nbytes)
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def _remember(self, key, result):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return
+        size = result_nbytes(result)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = result
+        self.nbytes += size
+        while self.nbytes > self.max_bytes or (self.max_entries is not None and len(self.entries) > self.max_entries):
+            _, evicted = self.entries.popitem(last=False)
+            self.nbytes -= result_nbytes(evicted)
+            self.counters["evictions"] += 1
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _save(self, key, result):
+        km = result.kmeans
+        index_to_id = np.array([result.index_to_id[i] for i in range(len(result.index_to_id))], dtype=np.int8)
+        with tempfile.NamedTemporaryFile(dir=self.directory, prefix=f"{key}.", suffix=".tmp", delete=False) as f:
+            try:
+                np.savez(f, clusters=result.clusters, labels=result.labels, centroids=result.centroids,
+                         mins=result.mins, maxs=result.maxs, index_to_id=index_to_id, avg_active=result.avg_active,
+                         low_separation=result.low_separation, iterations=km.iterations, inertia=km.inertia,
+                         delta=km.delta, converged=km.converged)
+            except BaseException:
+                f.close()
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, self._path(key))
+
+    def _trim_disk(self):
+        """Remove the least recently used .npz files until the directory fits in max_disk_bytes."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npz"):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.counters["disk_evictions"] += 1
+
+    def _load(self, key):
+        path = self._path(key)
+        try:
+            os.utime(path)             # mark it recently used for _trim_disk()
+            with np.load(path) as data:
+                km = KMeansResult(data["labels"], data["centroids"], int(data["iterations"]),
+                                  float(data["inertia"]), float(data["delta"]), bool(data["converged"]))
+                result = AnalysisResult(
+                    clusters=data["clusters"],
+                    labels=km.labels,
+                    centroids=km.centroids,
+                    mins=data["mins"],
+                    maxs=data["maxs"],
+                    index_to_id={i: int(c) for i, c in enumerate(data["index_to_id"])},
+                    avg_active=data["avg_active"],
+                    low_separation=bool(data["low_separation"]),
+                    kmeans=km,
+                )
+            return result
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def cached_analysis(X, cache, k=3, seed=42, max_iter=100, tol=1e-6):
+    """run_analysis() through ``cache``; AnalysisError is raised, never cached."""
+    key = fingerprint(X, k, seed, max_iter, tol)
+    result = cache.get(key)
+    if result is None:
+        result = run_analysis(X, k, seed, max_iter, tol)
+        cache.put(key, result)
+    return result
@@ -0,0 +1,183 @@
+import json
+import os
+
+import numpy as np
+
+from analysis import FEATURES
+
+# Numeric fields of Sample: the clustering features, then the optional
+# display-only measurements (NaN when a sample does not have them).
+NUMERIC = FEATURES + ("ForeignMatter", "HPTLCRf")
+OPTIONAL_NUMERIC = ("ForeignMatter", "HPTLCRf")
+TEXT = ("Brand", "Color", "Odor", "Taste")
+TESTS = ("Alkaloids", "Flavonoids", "Steroids", "Polyphenols", "Saponins", "Sugars")
+
+FORMAT_VERSION = 1
+
+
+def numeric_dtype(dtype=np.float64):
+    return np.dtype([(name, dtype) for name in NUMERIC])
+
+
+class Dictionary:
+    """String <-> code mapping for one dictionary-encoded column. Code 0 is ''."""
+
+    def __init__(self, values=("",)):
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def encode(self, value):
+        value = value or ""
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def decode(self, codes):
+        return np.asarray(self.values, dtype=object)[codes]
+
+
+class SampleStore:
+    """Columnar storage for Sample records.
+
+    - numeric: a structured array with one field per NUMERIC column. Fields
+      share one dtype, so features() is a view rather than a copy.
+    - Brand, Color, Odor and Taste: uint32 codes into a per-column Dictionary.
+    - Phytochemical tests: two uint8 bitmasks, with bit i for TESTS[i].
+      ``tested`` holds 'Pass' or 'Fail' and ``passed`` holds 'Pass'; a test
+      with its tested bit clear is ''.
+
+    save() writes one .npy file per column plus meta.json. load() maps them
+    with mmap_mode so that opening a large store copies nothing.
+    """
+
+    def __init__(self, sample_ids, numeric, codes, dictionaries, tested, passed):
+        self.sample_ids = sample_ids
+        self.numeric = numeric
+        self.codes = codes
+        self.dictionaries = dictionaries
+        self.tested = tested
+        self.passed = passed
+
+    def __len__(self):
+        return len(self.numeric)
+
+    @classmethod
+    def from_samples(cls, samples, dtype=np.float64):
+        n = len(samples)
+        numeric = np.full(n, np.nan, dtype=numeric_dtype(dtype))
+        for name in NUMERIC:
+            if name in OPTIONAL_NUMERIC:
+                numeric[name] = [s.get(name, np.nan) for s in samples]
+            else:
+                numeric[name] = [s[name] for s in samples]
+
+        dictionaries = {name: Dictionary() for name in TEXT}
+        codes = {name: np.fromiter((dictionaries[name].encode(s.get(name)) for s in samples), dtype=np.uint32, count=n)
+                 for name in TEXT}
+
+        tested = np.zeros(n, dtype=np.uint8)
+        passed = np.zeros(n, dtype=np.uint8)
+        for bit, name in enumerate(TESTS):
+            values = [s.get(name) or "" for s in samples]
+            tested |= np.array([v != "" for v in values], dtype=np.uint8) << bit
+            passed |= np.array([v == "Pass" for v in values], dtype=np.uint8) << bit
+
+        sample_ids = np.array([s["SampleID"] for s in samples], dtype=str)
+        return cls(sample_ids, numeric, codes, dictionaries, tested, passed)
+
+    @classmethod
+    def from_features(cls, sample_ids, brands, X, dtype=np.float64):
+        """Store for rows that only carry Brand and the 10 clustering features."""
+        n = len(X)
+        numeric = np.full(n, np.nan, dtype=numeric_dtype(dtype))
+        for j, name in enumerate(FEATURES):
+            numeric[name] = X[:, j]
+        dictionaries = {name: Dictionary() for name in TEXT}
+        codes = {name: np.zeros(n, dtype=np.uint32) for name in TEXT}
+        codes["Brand"] = np.fromiter((dictionaries["Brand"].encode(b) for b in brands), dtype=np.uint32, count=n)
+        empty = np.zeros(n, dtype=np.uint8)
+        return cls(np.asarray(sample_ids, dtype=str), numeric, codes, dictionaries, empty, empty.copy())
+
+    def features(self):
+        """(n, 10) view of the clustering features, in FEATURES order."""
+        flat = self.numeric.view(self.numeric.dtype[0]).reshape(len(self), len(NUMERIC))
+        return flat[:, :len(FEATURES)]
+
+    def column(self, name):
+        if name in TEXT:
+            return self.dictionaries[name].decode(self.codes[name])
+        return self.numeric[name]
+
+    def test_mask(self, name, value="Pass"):
+        bit = np.uint8(1 << TESTS.index(name))
+        tested = (self.tested & bit) != 0
+        if value == "":
+            return ~tested
+        passed = (self.passed & bit) != 0
+        return tested & (passed if value == "Pass" else ~passed)
+
+    def brand_mask(self, brand):
+        code = self.dictionaries["Brand"].codes.get(brand)
+        if code is None:
+            return np.zeros(len(self), dtype=bool)
+        return self.codes["Brand"] == code
+
+    def sample(self, i):
+        """Sample dict for row i, leaving out optional fields that are unset."""
+        row = self.numeric[i]
+        sample = {"SampleID": str(self.sample_ids[i]), "Brand": self.dictionaries["Brand"].values[self.codes["Brand"][i]]}
+        for name in FEATURES:
+            sample[name] = float(row[name])
+        for name in TEXT[1:]:
+            value = self.dictionaries[name].values[self.codes[name][i]]
+            if value:
+                sample[name] = value
+        for name in OPTIONAL_NUMERIC:
+            if not np.isnan(row[name]):
+                sample[name] = float(row[name])
+        for bit, name in enumerate(TESTS):
+            if self.tested[i] >> bit & 1:
+                sample[name] = "Pass" if self.passed[i] >> bit & 1 else "Fail"
+        return sample
+
+    def to_samples(self):
+        return [self.sample(i) for i in range(len(self))]
+
+    @property
+    def nbytes(self):
+        return (self.sample_ids.nbytes + self.numeric.nbytes + self.tested.nbytes + self.passed.nbytes
+                + sum(codes.nbytes for codes in self.codes.values()))
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "sample_ids.npy"), self.sample_ids)
+        np.save(os.path.join(path, "numeric.npy"), self.numeric)
+        np.save(os.path.join(path, "tested.npy"), self.tested)
+        np.save(os.path.join(path, "passed.npy"), self.passed)
+        for name in TEXT:
+            np.save(os.path.join(path, f"{name}.npy"), self.codes[name])
+        meta = {
+            "version": FORMAT_VERSION,
+            "count": len(self),
+            "tests": list(TESTS),
+            "dictionaries": {name: d.values for name, d in self.dictionaries.items()},
+        }
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        if meta["version"] != FORMAT_VERSION:
+            raise ValueError(f"unsupported sample store version {meta['version']}")
+        mode = "r" if mmap else None
+
+        def column(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+
+        dictionaries = {name: Dictionary(values) for name, values in meta["dictionaries"].items()}
+        codes = {name: column(name) for name in TEXT}
+        return cls(column("sample_ids"), column("numeric"), codes, dictionaries, column("tested"), column("passed"))
@@ -0,0 +1,127 @@
+import math
+
+import numpy as np
+
+LEVELS = 4
+BASE_BINS = 32                 # bins per axis at level 0; doubles each level
+MAX_POINTS = 2000              # marks sent per view
+OUTLIER_COUNT = 2              # points alone (or nearly) in a level-0 bin stay unbinned
+
+
+def x_domain(active):
+    """scatterXDomain: [floor(min - 5) clamped at 0, ceil(max + 2)], or [50, 100] with no data."""
+    if len(active) == 0:
+        return [50, 100]
+    return [max(0, math.floor(float(active.min()) - 5)), math.ceil(float(active.max()) + 2)]
+
+
+def y_domain(heavy):
+    if len(heavy) == 0:
+        return [0, 1]
+    return [0, math.ceil(float(heavy.max()) + 1)]
+
+
+class ScatterLOD:
+    """Level-of-detail data for the Active % vs Heavy Metal ppm scatter plot.
+
+    Points are binned per cluster on an axis-aligned grid over the
+    precomputed domains. Level z has BASE_BINS * 2**z bins per axis, and
+    each non-empty bin becomes one mark at the mean position of its points,
+    carrying a count. Custom (C-) samples and outliers stay as raw points at
+    every level and are always sent. A point is an outlier when at most
+    OUTLIER_COUNT points of its cluster share its coarsest (level 0) bin.
+
+    view() answers one viewport within a point budget. It returns raw
+    points if they fit; otherwise it uses the finest level whose marks fit
+    next to the kept points.
+    """
+
+    def __init__(self, sample_ids, active, heavy, clusters, levels=LEVELS, base_bins=BASE_BINS,
+                 outlier_count=OUTLIER_COUNT):
+        self.sample_ids = np.asarray(sample_ids)
+        self.x = np.asarray(active, dtype=np.float64)
+        self.y = np.asarray(heavy, dtype=np.float64)
+        self.clusters = np.asarray(clusters, dtype=np.int8)
+        self.x_domain = x_domain(self.x)
+        self.y_domain = y_domain(self.y)
+
+        # Raw points sorted by x so a viewport is a searchsorted slice.
+        order = np.argsort(self.x, kind="stable")
+        self.order = order
+        self.sorted_x = self.x[order]
+
+        custom = np.char.startswith(self.sample_ids.astype(str), "C-")
+        _, inverse, counts = np.unique(self._bin_keys(base_bins), return_inverse=True, return_counts=True)
+        self.keep = custom | (counts[inverse.ravel()] <= outlier_count)
+
+        self.levels = [self._tiles(base_bins << z) for z in range(levels)]
+
+    def _bin_keys(self, bins):
+        (x0, x1), (y0, y1) = self.x_domain, self.y_domain
+        ix = np.clip(((self.x - x0) / (x1 - x0) * bins).astype(np.int64), 0, bins - 1)
+        iy = np.clip(((self.y - y0) / (y1 - y0) * bins).astype(np.int64), 0, bins - 1)
+        return (self.clusters.astype(np.int64) * bins + ix) * bins + iy
+
+    def _tiles(self, bins):
+        binned = ~self.keep
+        keys = self._bin_keys(bins)[binned]
+        unique, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        mean_x = np.bincount(inverse, weights=self.x[binned], minlength=len(unique)) / counts
+        mean_y = np.bincount(inverse, weights=self.y[binned], minlength=len(unique)) / counts
+        return {
+            "bins": bins,
+            "cluster": (unique // (bins * bins)).astype(np.int8),
+            "x": mean_x,
+            "y": mean_y,
+            "count": counts,
+        }
+
+    def _points_in(self, x0, x1, y0, y1, mask=None):
+        lo = np.searchsorted(self.sorted_x, x0, side="left")
+        hi = np.searchsorted(self.sorted_x, x1, side="right")
+        idx = self.order[lo:hi]
+        idx = idx[(self.y[idx] >= y0) & (self.y[idx] <= y1)]
+        if mask is not None:
+            idx = idx[mask[idx]]
+        return np.sort(idx)
+
+    def _point_dicts(self, idx):
+        return [{"SampleID": str(self.sample_ids[i]), "ActiveCompoundPct": float(self.x[i]),
+                 "HeavyMetalPpm": float(self.y[i]), "Cluster": int(self.clusters[i])} for i in idx]
+
+    def view(self, x0=None, x1=None, y0=None, y1=None, max_points=MAX_POINTS):
+        """Marks for one viewport (defaults to the full domains), at most ``max_points``
+        of them unless the kept raw points alone exceed it.
+
+        Returns {"level", "points", "bins", "xDomain", "yDomain"}. Level is
+        None when every point is sent raw. Bins look like points but have
+        a "count" and no SampleID.
+        """
+        x0 = self.x_domain[0] if x0 is None else x0
+        x1 = self.x_domain[1] if x1 is None else x1
+        y0 = self.y_domain[0] if y0 is None else y0
+        y1 = self.y_domain[1] if y1 is None else y1
+        result = {"level": None, "points": [], "bins": [], "xDomain": [x0, x1], "yDomain": [y0, y1]}
+
+        everything = self._points_in(x0, x1, y0, y1)
+        if len(everything) <= max_points:
+            result["points"] = self._point_dicts(everything)
+            return result
+
+        kept = self._points_in(x0, x1, y0, y1, self.keep)
+        budget = max_points - len(kept)
+        chosen = None
+        for z, tiles in enumerate(self.levels):
+            inside = (tiles["x"] >= x0) & (tiles["x"] <= x1) & (tiles["y"] >= y0) & (tiles["y"] <= y1)
+            # Level 0 is the fallback even when it is over budget.
+            if chosen is not None and np.count_nonzero(inside) > budget:
+                break
+            chosen = (z, tiles, inside)
+        z, tiles, inside = chosen
+        result["level"] = z
+        result["points"] = self._point_dicts(kept)
+        result["bins"] = [{"ActiveCompoundPct": float(x), "HeavyMetalPpm": float(y), "Cluster": int(c), "count": int(n)}
+                          for x, y, c, n in zip(tiles["x"][inside], tiles["y"][inside], tiles["cluster"][inside],
+                                                tiles["count"][inside])]
+        return result
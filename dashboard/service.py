@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from aggregates import Aggregates
+from analysis import LOW_SEPARATION, AnalysisError, feature_matrix, run_analysis
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY = 256 * 1024 * 1024
+STREAM_SAMPLES = 1000          # AnalyzedSamples per streamed chunk
+COALESCE_WINDOW = 0.25         # seconds a finished result is shared with identical requests
+
+REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+CORS = (
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
+    b"Access-Control-Allow-Headers: Content-Type\r\n"
+)
+
+
+def analyze_body(body):
+    """Worker side of POST /analyze: JSON request body in, encoded response pieces out.
+
+    Returns (status, pieces). For a 200 the pieces concatenate to
+    {"samples": [AnalyzedSample, ...], "clusterStats": ..., "clusterCounts": ...,
+    "lowSeparation": ..., "warning": ...}, with STREAM_SAMPLES samples per
+    piece. Otherwise there is one piece, the error body. Parsing and
+    encoding both happen here, so the event loop only writes bytes.
+    """
+    try:
+        payload = json.loads(body)
+        samples = payload["samples"] if isinstance(payload, dict) else payload
+        X = feature_matrix(samples)
+        brands = [s["Brand"] for s in samples]
+    except (ValueError, KeyError, TypeError) as e:
+        return 400, [json.dumps({"error": f"invalid request: {e}"}).encode()]
+    try:
+        result = run_analysis(X)
+    except AnalysisError as e:
+        return 400, [json.dumps({"error": str(e)}).encode()]
+
+    aggregates = Aggregates.build(brands, X, result.clusters)
+    tail = {
+        "clusterStats": aggregates.cluster_stats(),
+        "clusterCounts": aggregates.cluster_count_map(),
+        "lowSeparation": result.low_separation,
+        "warning": LOW_SEPARATION if result.low_separation else None,
+    }
+    pieces = [b'{"samples": [']
+    for start in range(0, len(samples), STREAM_SAMPLES):
+        chunk = ", ".join(json.dumps(dict(s, Cluster=int(c)))
+                          for s, c in zip(samples[start:start + STREAM_SAMPLES],
+                                          result.clusters[start:start + STREAM_SAMPLES]))
+        pieces.append((", " if start else "").encode() + chunk.encode())
+    pieces.append(b"], " + json.dumps(tail).encode()[1:])
+    return 200, pieces
+
+
+class AnalysisService:
+    """Asyncio HTTP front end for run_analysis().
+
+    Parsing, fits and response encoding run in a process pool, which
+    returns the response as encoded chunks; the event loop writes them out
+    one at a time as the connection drains. If a worker dies, its requests
+    fail with a 500 and the pool is replaced.
+
+    Requests with identical bodies are coalesced. While one fit is running,
+    others with the same body await it. A finished result is also reused
+    for COALESCE_WINDOW seconds, which covers sessions refreshing together.
+
+    Endpoints:
+    - POST /analyze takes {"samples": [Sample, ...]} or a bare list and
+      streams the response with chunked transfer encoding.
+    - GET /health returns pool and coalescing counters.
+    """
+
+    def __init__(self, workers=None, window=COALESCE_WINDOW):
+        self.workers = workers or os.cpu_count()
+        self.pool = self._new_pool()
+        self.window = window
+        self.inflight = {}
+        self.counters = {"requests": 0, "fits": 0, "coalesced": 0, "errors": 0, "pool_restarts": 0}
+
+    def _new_pool(self):
+        # Spawned, not forked: a forked worker would inherit the listening
+        # socket and every client socket open when the pool first starts,
+        # holding those connections open after the server closes them.
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _replace_pool(self, broken):
+        """Swap in a new pool after a worker died (e.g. killed for memory); later requests use it."""
+        if self.pool is broken:
+            logger.warning("analysis worker died, restarting the pool")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.pool = self._new_pool()
+            self.counters["pool_restarts"] += 1
+
+    async def analyze(self, body):
+        key = hashlib.sha256(body).digest()
+        future = self.inflight.get(key)
+        if future is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(future)
+        loop = asyncio.get_running_loop()
+        pool = self.pool
+        try:
+            future = loop.run_in_executor(pool, analyze_body, body)
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+            raise
+        self.inflight[key] = future
+        self.counters["fits"] += 1
+        try:
+            return await asyncio.shield(future)
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+            raise
+        finally:
+            loop.call_later(self.window, self.inflight.pop, key, None)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader, writer)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._dispatch(method, path, body, writer, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader, writer):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            await self._respond(writer, 400, b'{"error": "malformed request line"}', keep_alive=False)
+            return None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            await self._respond(writer, 400, b'{"error": "invalid Content-Length"}', keep_alive=False)
+            return None
+        if length > MAX_BODY:
+            await self._respond(writer, 413, b'{"error": "request body too large"}', keep_alive=False)
+            return None
+        body = await reader.readexactly(length) if length else b""
+        return method, target.split("?", 1)[0], headers, body
+
+    async def _dispatch(self, method, path, body, writer, keep_alive):
+        self.counters["requests"] += 1
+        if method == "OPTIONS":
+            await self._respond(writer, 204, b"", keep_alive)
+        elif path == "/health":
+            await self._respond(writer, 200, json.dumps(dict(self.counters, inflight=len(self.inflight))).encode(), keep_alive)
+        elif path != "/analyze":
+            await self._respond(writer, 404, b'{"error": "not found"}', keep_alive)
+        elif method != "POST":
+            await self._respond(writer, 405, b'{"error": "use POST"}', keep_alive)
+        else:
+            started = time.perf_counter()
+            try:
+                status, pieces = await self.analyze(body)
+            except Exception:
+                logger.exception("analysis failed")
+                status, pieces = 500, [b'{"error": "analysis failed"}']
+            if status != 200:
+                self.counters["errors"] += 1
+            await self._stream(writer, status, pieces, keep_alive)
+            logger.info("POST /analyze %d %d bytes %.3fs", status, len(body), time.perf_counter() - started)
+
+    async def _respond(self, writer, status, body, keep_alive):
+        writer.write(self._head(status, keep_alive) + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def _stream(self, writer, status, pieces, keep_alive):
+        writer.write(self._head(status, keep_alive) + b"Transfer-Encoding: chunked\r\n\r\n")
+        for piece in pieces:
+            writer.write(b"%x\r\n%s\r\n" % (len(piece), piece))
+            # Back-pressure: a slow reader never makes the server buffer
+            # more than one chunk per connection.
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    def _head(status, keep_alive):
+        return (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                "Content-Type: application/json\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n").encode() + CORS
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        logger.info("listening on http://%s:%d", host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.pool.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP service running the dashboard's clustering analysis.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="analysis worker processes (default: CPU count)")
+    parser.add_argument("--window", type=float, default=COALESCE_WINDOW,
+                        help=f"seconds to share a finished result with identical requests (default: {COALESCE_WINDOW})")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    service = AnalysisService(args.workers, args.window)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())